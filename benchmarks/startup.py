@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Measure the cold start time of ``tldr <command>`` for a page in the cache.
+
+Every run starts a new interpreter against a cache holding a single fresh
+page, without any network access. The startup time of a bare interpreter
+is measured the same way and subtracted, which leaves the time spent
+importing tldr, parsing the arguments and rendering the page.
+
+Most of that time goes to the standard library modules a lookup cannot do
+without, so an interpreter importing just those is measured as well. The
+target applies to the rest, the time tldr itself spends.
+
+    python benchmarks/startup.py               # print the timings
+    python benchmarks/startup.py --check       # fail if over the target
+    python benchmarks/startup.py --importtime  # refresh importtime.txt
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+IMPORTTIME_PATH = Path(__file__).resolve().parent / 'importtime.txt'
+
+# Median time of a cache hit over the startup of an interpreter importing
+# STDLIB_MODULES: the import of tldr itself, the parsing of the arguments,
+# and the lookup and rendering of the page
+TARGET_MS = 20
+
+# The standard library modules imported by ``python -m tldr`` on a cache hit.
+# locale is imported by the gettext calls of argparse.
+STDLIB_MODULES = (
+    'argparse', 'collections', 'io', 'locale', 'math', 'mmap', 'pathlib',
+    're', 'runpy', 'struct', 'threading', 'typing', 'zlib',
+)
+
+PAGE = b"""# tar
+
+> Archiving utility.
+
+- Create an archive from files:
+
+`tar cf {{path/to/target.tar}} {{path/to/file1 path/to/file2 ...}}`
+"""
+
+
+def get_env(home: str) -> dict:
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env.pop('XDG_CACHE_HOME', None)
+    env.update({
+        'HOME': home,
+        'LANG': 'C',
+        'PYTHONPATH': str(ROOT),
+        'TLDR_LANGUAGE': '',
+        'TLDR_NETWORK_ENABLED': '0',
+    })
+    env.pop('LANGUAGE', None)
+    return env
+
+
+def time_runs(env: dict, runs: int, commands: list) -> list:
+    """Time the commands in turn, so that they see the same load of the
+    machine, and return the timings of each."""
+    # The first run writes the bytecode cache, as an installed package has one.
+    # python -m looks for the module in the working directory first.
+    for command in commands:
+        subprocess.run(command, env=env, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    timings = [[] for _ in commands]
+    for _ in range(runs):
+        for command, command_timings in zip(commands, timings):
+            start = time.perf_counter()
+            subprocess.run(command, env=env, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+            command_timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def record_importtime(env: dict) -> None:
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import tldr'],
+        env=env, cwd=ROOT, check=True, capture_output=True, text=True
+    )
+    lines = [line for line in result.stderr.splitlines() if line.startswith('import time:')]
+    header, rows = lines[0], lines[1:]
+    rows.sort(key=lambda line: int(line.split('|')[1]), reverse=True)
+    IMPORTTIME_PATH.write_text(
+        f"# python -X importtime -c 'import tldr', Python {sys.version.split()[0]}\n"
+        "# Regenerate with: python benchmarks/startup.py --importtime\n"
+        + '\n'.join([header] + rows) + '\n'
+    )
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--runs', type=int, default=20)
+    parser.add_argument('--check', action='store_true',
+                        help=f"Exit with status 1 if the median is over {TARGET_MS}ms")
+    parser.add_argument('--importtime', action='store_true',
+                        help=f"Write the import time breakdown to {IMPORTTIME_PATH.name}")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        page_dir = Path(home) / '.cache' / 'tldr' / 'pages' / 'common'
+        page_dir.mkdir(parents=True)
+        (page_dir / 'tar.md').write_bytes(PAGE)
+        env = get_env(home)
+        baseline, stdlib, timings = time_runs(env, options.runs, [
+            [sys.executable, '-c', 'pass'],
+            [sys.executable, '-c', f"import {', '.join(STDLIB_MODULES)}"],
+            [sys.executable, '-m', 'tldr', 'tar'],
+        ])
+        if options.importtime:
+            record_importtime(env)
+
+    overhead = statistics.median(timings) - statistics.median(baseline)
+    own = statistics.median(timings) - statistics.median(stdlib)
+    print(f"interpreter: median {statistics.median(baseline):.1f}ms, min {min(baseline):.1f}ms")
+    print(f"standard library: median {statistics.median(stdlib):.1f}ms, min {min(stdlib):.1f}ms")
+    print(f"cache hit: median {statistics.median(timings):.1f}ms, min {min(timings):.1f}ms")
+    print(f"tldr overhead: {overhead:.1f}ms over {options.runs} runs")
+    print(f"tldr own time: {own:.1f}ms over the standard library (target {TARGET_MS}ms)")
+    if options.check and own > TARGET_MS:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Time the lookup, render, list, search and update paths of tldr.
+
+Every benchmark runs in this process against a synthetic pages tree,
+generated from a fixed seed and served by a local HTTP server, so the
+results do not depend on the network or on the upstream pages. The
+median of each benchmark is compared with the one stored in
+baseline.json, which should be refreshed on the same machine before
+comparing a change. The disk space taken by the pages in each cache
+format is reported too.
+
+    python benchmarks/suite.py                   # print the timings
+    python benchmarks/suite.py --json out.json   # also write them as JSON
+    python benchmarks/suite.py --save-baseline   # refresh baseline.json
+    python benchmarks/suite.py --check           # fail on a regression
+"""
+
+import contextlib
+import functools
+import http.server
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+sys.path.insert(0, str(ROOT))
+
+# A median this much over the baseline counts as a regression
+TOLERANCE = 0.25
+
+CACHE_FORMATS = ['files', 'pack', 'compressed', 'zip']
+PLATFORMS = ['common', 'linux', 'osx', 'windows', 'android', 'freebsd', 'openbsd']
+SYLLABLES = [
+    'ar', 'ba', 'cat', 'do', 'ex', 'fi', 'git', 'ho', 'in', 'jo', 'ka', 'lo',
+    'mv', 'no', 'ob', 'pa', 'qu', 'ra', 'sh', 'ta', 'un', 'vi', 'wa', 'xe',
+]
+WORDS = [
+    'archive', 'file', 'directory', 'list', 'display', 'create', 'remove',
+    'network', 'process', 'compress', 'extract', 'search', 'print', 'copy',
+    'move', 'user', 'package', 'install', 'update', 'server', 'connect',
+    'image', 'convert', 'output', 'input', 'recursive', 'verbose', 'format',
+]
+
+
+def get_page(command: str, rng: random.Random) -> str:
+    lines = [f"# {command}", "", f"> {rng.choice(WORDS).capitalize()} {' '.join(rng.sample(WORDS, 6))}."]
+    lines.append(f"> More information: <https://example.com/{command}>.")
+    for _ in range(rng.randint(4, 8)):
+        words = rng.sample(WORDS, 3)
+        lines += [
+            "",
+            f"- {words[0].capitalize()} the {words[1]} of a {words[2]}:",
+            "",
+            f"`{command} --{words[0]} {{{{path/to/{words[1]}}}}} {{{{{words[2]}}}}}`",
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def write_pages(root: Path, count: int) -> List[str]:
+    """Write the synthetic pages as a tree and as the English release archive,
+    and return the names of the common commands."""
+    rng = random.Random(count)
+    names = set()
+    while len(names) < count:
+        names.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    commands = {}
+    for name in sorted(names):
+        commands.setdefault(rng.choice(PLATFORMS[:3] + PLATFORMS), []).append(name)
+    with zipfile.ZipFile(root / 'tldr-pages.en.zip', 'w', zipfile.ZIP_DEFLATED) as archive:
+        for platform_name, names in commands.items():
+            (root / 'pages' / platform_name).mkdir(parents=True)
+            for name in names:
+                page = get_page(name, rng)
+                (root / 'pages' / platform_name / f"{name}.md").write_text(page)
+                archive.writestr(f"{platform_name}/{name}.md", page)
+    return commands['common']
+
+
+@contextlib.contextmanager
+def serve_directory(root: Path):
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(
+        ('127.0.0.1', 0), functools.partial(Handler, directory=str(root))
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def discard_stdout() -> contextlib.redirect_stdout:
+    # The renderer writes bytes to sys.stdout.buffer
+    return contextlib.redirect_stdout(io.TextIOWrapper(io.BytesIO(), encoding='utf-8'))
+
+
+def time_runs(run: Callable[[], object], runs: int, setup: Optional[Callable[[], object]] = None) -> List[float]:
+    timings = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run_benchmarks(tldr, commands: List[str], runs: int) -> Dict[str, List[float]]:
+    cache_dir = tldr.get_cache_dir()
+    rng = random.Random(0)
+    sample = rng.sample(commands, min(len(commands), 50))
+    jq = (ROOT / 'tests' / 'data' / 'jq.md').read_bytes().splitlines()
+    timings = {}
+
+    def update() -> None:
+        with discard_stdout():
+            tldr.update_cache()
+
+    timings['update'] = time_runs(update, max(runs // 4, 3), setup=lambda: shutil.rmtree(cache_dir, True))
+
+    def lookup_cold() -> None:
+        command = rng.choice(sample)
+        for platform_name in PLATFORMS:
+            tldr.get_cache_file_path(command, platform_name, 'en').unlink(missing_ok=True)
+        assert tldr.get_page_for_every_platform(command)
+
+    timings['lookup_cold'] = time_runs(lookup_cold, runs)
+    timings['lookup_warm'] = time_runs(lambda: tldr.get_page_for_every_platform(rng.choice(sample)), runs)
+
+    client = tldr.TldrClient()
+    for command in sample:
+        client.get_page_for_every_platform(command)
+    timings['lookup_client'] = time_runs(lambda: client.get_page_for_every_platform(rng.choice(sample)), runs)
+
+    def render() -> None:
+        tldr.reset_colors()
+        with discard_stdout():
+            tldr.output(jq, 'long')
+
+    timings['render_jq'] = time_runs(render, runs)
+    timings['list'] = time_runs(lambda: tldr.get_commands(['common']), runs)
+    timings['search'] = time_runs(lambda: tldr.search_pages('compress archive file'), runs)
+    return timings
+
+
+def get_disk_usage(cache_dir: Path) -> int:
+    """Return the bytes allocated to the pages in the cache, in whole blocks."""
+    usage = 0
+    for path in cache_dir.glob('pages*'):
+        for file in [path] if path.is_file() else path.rglob('*.md'):
+            stat = file.stat()
+            usage += stat.st_blocks * 512 if hasattr(stat, 'st_blocks') else stat.st_size
+    return usage
+
+
+def run_format_benchmarks(tldr, commands: List[str], runs: int) -> Tuple[Dict[str, List[float]], Dict[str, int]]:
+    """Update the cache in every format, and time reading a page from it."""
+    cache_dir = tldr.get_cache_dir()
+    rng = random.Random(0)
+    sample = rng.sample(commands, min(len(commands), 50))
+    timings = {}
+    disk_usage = {}
+    for cache_format in CACHE_FORMATS:
+        tldr.CACHE_FORMAT = cache_format
+        shutil.rmtree(cache_dir, True)
+        with discard_stdout():
+            tldr.update_cache()
+        disk_usage[cache_format] = get_disk_usage(cache_dir)
+        timings[f"read_{cache_format}"] = time_runs(
+            lambda: tldr.load_page_from_cache(rng.choice(sample), 'common', 'en'), runs
+        )
+    tldr.CACHE_FORMAT = 'files'
+    return timings, disk_usage
+
+
+def summarize(timings: Dict[str, List[float]]) -> Dict[str, dict]:
+    return {
+        name: {
+            'median_ms': round(statistics.median(values), 3),
+            'min_ms': round(min(values), 3),
+            'runs': len(values),
+        }
+        for name, values in timings.items()
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Print each median next to the baseline and return the regressions."""
+    regressions = []
+    for name, result in results.items():
+        line = f"{name:16} median {result['median_ms']:9.3f}ms  min {result['min_ms']:9.3f}ms"
+        if name in baseline:
+            ratio = result['median_ms'] / max(baseline[name]['median_ms'], 1e-6)
+            line += f"  {ratio:6.2f}x baseline"
+            if ratio > 1 + tolerance:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--runs', type=int, default=20)
+    parser.add_argument('--pages', type=int, default=2000,
+                        help="Number of pages in the synthetic tree")
+    parser.add_argument('--json', metavar='PATH', help="Write the results as JSON to PATH")
+    parser.add_argument('--baseline', metavar='PATH', default=str(BASELINE_PATH))
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Write the results to the baseline")
+    parser.add_argument('--check', action='store_true',
+                        help=f"Exit with status 1 if a median is {TOLERANCE:.0%} over the baseline")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        root = Path(home) / 'www'
+        root.mkdir()
+        commands = write_pages(root, options.pages)
+        os.environ.update({'HOME': home, 'LANG': 'C', 'TLDR_LANGUAGE': '', 'FORCE_COLOR': '1'})
+        for variable in ('LANGUAGE', 'XDG_CACHE_HOME', 'XDG_DATA_DIRS', 'TLDR_CACHE_MAX_AGE'):
+            os.environ.pop(variable, None)
+        import tldr
+        with serve_directory(root) as url:
+            tldr.PAGES_SOURCE_LOCATION = f"{url}/pages"
+            tldr.DOWNLOAD_CACHE_LOCATION = f"{url}/tldr.zip"
+            timings = run_benchmarks(tldr, commands, options.runs)
+            format_timings, disk_usage = run_format_benchmarks(tldr, commands, options.runs)
+            results = summarize({**timings, **format_timings})
+            tldr.HTTP_POOL.close()
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pages': options.pages,
+        'results': results,
+        'disk_usage': disk_usage,
+    }
+    baseline = {}
+    if Path(options.baseline).is_file() and not options.save_baseline:
+        baseline = json.loads(Path(options.baseline).read_text())['results']
+    regressions = compare(results, baseline, TOLERANCE)
+    for cache_format, usage in disk_usage.items():
+        print(f"{'disk_' + cache_format:16} {usage / 1024:12.0f}KiB")
+    if options.json:
+        Path(options.json).write_text(json.dumps(report, indent=2) + '\n')
+    if options.save_baseline:
+        Path(options.baseline).write_text(json.dumps(report, indent=2) + '\n')
+    if options.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
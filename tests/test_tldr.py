@@ -1,11 +1,25 @@
+import asyncio
+import functools
+import http.server
 import io
+import json
+import os
+import socket
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 import pytest
+import subprocess
 import sys
+import termcolor
 import tldr
+import time
 import types
+import zipfile
+import zlib
 from unittest import mock
+from urllib.error import HTTPError, URLError
 
 # gem is a basic test of page rendering
 # jq is a more complicated test for token parsing
@@ -31,6 +45,23 @@ def test_whole_page(page_name, monkeypatch):
             assert tldr_output == correct_output
 
 
+def test_get_styles(monkeypatch):
+    monkeypatch.setenv("FORCE_COLOR", "1")
+    monkeypatch.delenv("NO_COLOR", raising=False)
+    tldr.reset_colors()
+    assert tldr.get_styles()["name"] == ("\x1b[1m", "\x1b[0m")
+    assert tldr.get_styles()["code"] == ("\x1b[3m\x1b[33m", "\x1b[0m\x1b[23m")
+    monkeypatch.setenv("TLDR_COLOR_NAME", "cyan on_white underline")
+    prefix, suffix = tldr.get_styles()["name"]
+    assert prefix + "tar" + suffix == termcolor.colored("tar", "cyan", "on_white", ["underline"])
+
+    monkeypatch.delenv("FORCE_COLOR")
+    monkeypatch.setenv("NO_COLOR", "1")
+    tldr.reset_colors()
+    assert tldr.get_styles()["name"] == ("", "")
+    tldr.reset_colors()
+
+
 @pytest.mark.parametrize("page_name", page_names)
 def test_markdown_mode(page_name):
     with open(f"tests/data/{page_name}.md", "rb") as f_original:
@@ -156,3 +187,979 @@ def test_get_commands(monkeypatch, tmp_path):
     result = tldr.get_commands(platforms=["linux"], language=["zh_CN"])
 
     assert "lspci" in result
+
+
+def test_page_pack(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    with tldr.PagePackWriter(tldr.get_pack_path("en")) as pack:
+        pack.add("linux", "lspci", b"# lspci\n")
+        pack.add("common", "tar", b"# tar\n")
+        pack.add("common", "git", b"# git\n")
+
+    assert tldr.load_page_from_cache("tar", "common", "en") == b"# tar\n"
+    assert tldr.load_page_from_cache("tar", "linux", "en") is None
+    assert tldr.get_commands(platforms=["common"], language=["en"]) == ["git", "tar"]
+    assert tldr.have_recent_cache("lspci", "linux", "en")
+
+    # The mapping is closed before a new pack replaces it
+    pack = tldr.open_page_pack("en")
+    with tldr.PagePackWriter(tldr.get_pack_path("en")) as writer:
+        writer.add("common", "tar", b"# tar\n")
+        writer.add("common", "git", b"# git\n")
+    assert pack._map.closed
+    assert tldr.get_pack_path("en") not in tldr._PAGE_PACKS
+    assert tldr.load_page_from_cache("lspci", "linux", "en") is None
+
+    # Pages fetched one by one override the pack
+    tldr.store_page_to_cache(b"# tar (updated)\n", "tar", "common", "en")
+    assert tldr.load_page_from_cache("tar", "common", "en") == b"# tar (updated)\n"
+    assert sorted(tldr.get_commands(platforms=["common"], language=["en"])) == ["git", "tar"]
+
+
+def test_page_pack_compressed(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    pages = {
+        command: f"# {command}\n\n> Archiving utility.\n\n- Extract an archive:\n\n`{command} -xf {{{{path/to/file}}}}`\n".encode()
+        for command in ("tar", "bsdtar", "gtar")
+    }
+    dictionary = tldr.train_dictionary(pages.values())
+    assert b"- Extract an archive:\n" in dictionary
+    assert len(dictionary) <= tldr.PACK_DICTIONARY_SIZE
+    with tldr.PagePackWriter(tldr.get_pack_path("en"), dictionary) as pack:
+        for command, page in pages.items():
+            pack.add("common", command, page)
+
+    for command, page in pages.items():
+        assert tldr.load_page_from_cache(command, "common", "en") == page
+    pack = tldr.open_page_pack("en")
+    # The CRC32 is the one of the page, and the page is stored in fewer bytes
+    assert [(command, crc, size < 30) for _, command, size, crc in pack.entries()] == [
+        (command, zlib.crc32(pages[command]), True) for command in sorted(pages)
+    ]
+    assert tldr.get_commands(platforms=["common"], language=["en"]) == ["bsdtar", "gtar", "tar"]
+
+
+def test_page_archive(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    archive_path = tldr.get_archive_path("en")
+    archive_path.parent.mkdir(parents=True)
+    with zipfile.ZipFile(archive_path, "w") as zip_file:
+        zip_file.writestr("LICENSE.md", "License\n")
+        zip_file.writestr("common/tar.md", "# tar\n" * 10, zipfile.ZIP_DEFLATED)
+        zip_file.writestr("linux/tar.md", "# tar (linux)\n")
+        zip_file.writestr("common/bsdtar.md", "# bsdtar\n")
+
+    assert tldr.load_page_from_cache("tar", "common", "en") == b"# tar\n" * 10
+    assert tldr.load_page_from_cache("tar", "linux", "en") == b"# tar (linux)\n"
+    # Only a whole name in the central directory matches
+    assert tldr.load_page_from_cache("ar", "common", "en") is None
+    assert tldr.get_commands(platforms=["common"], language=["en"]) == ["bsdtar", "tar"]
+    # Once every record was read, lookups use them instead of searching the directory
+    archive = tldr.open_page_archive("en")
+    assert len(archive._records) == 4
+    assert archive.get("linux", "tar") == b"# tar (linux)\n"
+    assert archive.get("osx", "tar") is None
+    assert [result[0] for result in tldr.search_pages("tar", ["linux", "common"], ["en"])] == ["tar", "bsdtar"]
+
+
+def test_update_cache_pack(monkeypatch, tmp_path):
+    archive = tmp_path / "tldr-pages.en.zip"
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("common/tar.md", "# tar\n")
+        zip_file.writestr("linux/lspci.md", "# lspci\n")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setattr(tldr, "CACHE_FORMAT", "pack")
+    monkeypatch.setattr(tldr, "DOWNLOAD_CACHE_LOCATION", (tmp_path / "tldr.zip").as_uri())
+
+    tldr.update_cache()
+
+    assert tldr.get_pack_path("en").is_file()
+    assert not (tmp_path / ".cache" / "tldr" / "pages").exists()
+    assert tldr.load_page_from_cache("lspci", "linux", "en") == b"# lspci\n"
+
+
+def test_command_index(monkeypatch, tmp_path):
+    cache_default = tmp_path / ".cache" / "tldr" / "pages" / "linux"
+    Path.mkdir(cache_default, parents=True)
+    (cache_default / "lspci.md").write_bytes(b"# lspci\n")
+    monkeypatch.setenv("HOME", str(tmp_path))
+
+    assert tldr.open_command_index(["en"]) is None
+    assert tldr.get_commands(platforms=["linux"], language=["en"]) == ["lspci"]
+
+    index = tldr.open_command_index(["en"])
+    assert list(index.entries())[0][:4] == ("lspci", "linux", "en", 8)
+
+    # Adding a page makes the index stale until it is rebuilt
+    Path.touch(cache_default / "lsusb.md")
+    assert tldr.open_command_index(["en"]) is None
+    assert sorted(tldr.get_commands(platforms=["linux"], language=["en"])) == ["lspci", "lsusb"]
+    assert tldr.open_command_index(["en"]) is not None
+
+
+def test_find_cached_pages(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("XDG_DATA_DIRS", str(tmp_path / "missing"))
+    for command, platform in (("tar", "common"), ("tar", "linux"), ("lsof", "linux"), ("ls", "osx")):
+        tldr.store_page_to_cache(f"# {command}".encode(), command, platform, "en")
+    tldr.build_command_index()
+    index = tldr.load_command_index()
+    assert [page[:2] for page in index.find("tar")] == [("common", "en"), ("linux", "en")]
+    assert index.find("ta") == [] and index.find("zip") == []
+
+    platforms = ["linux", "common", "osx"]
+    assert tldr.find_cached_pages("tar", platforms, ["en"]) == {("common", "en"), ("linux", "en")}
+    assert tldr.find_cached_pages("tar", platforms, ["en"], system_cache=True) == set()
+    # A page stored since the index was built is found in its changed directory
+    tldr.store_page_to_cache(b"# zip", "zip", "osx", "en")
+    assert tldr.find_cached_pages("zip", platforms, ["en"]) == {("osx", "en")}
+    assert tldr.get_page_for_every_platform("zip", platforms=["osx"], languages=["en"]) == [([b"# zip"], "osx")]
+    with mock.patch("tldr.get_cache_state", wraps=tldr.get_cache_state) as get_cache_state:
+        assert tldr.get_page("tar", platforms=platforms, languages=["de", "en"]) == [b"# tar"]
+    # Only the page found is checked
+    get_cache_state.assert_called_once_with("tar", "linux", "en")
+
+    # Without an index, a lookup checks every platform instead of building one
+    index_path = tldr.get_command_index_path()
+    tldr._COMMAND_INDEXES.pop(index_path)[1].close()
+    index_path.unlink()
+    with mock.patch("tldr.scan_command_entries") as scan_command_entries:
+        assert tldr.find_cached_pages("tar", platforms, ["en"]) is None
+        assert tldr.get_page("lsof", platforms=platforms, languages=["en"]) == [b"# lsof"]
+    scan_command_entries.assert_not_called()
+    assert not index_path.exists()
+    # Storing a downloaded page builds it
+    tldr.store_page_to_cache(b"# gzip", "gzip", "linux", "en")
+    assert [page[:2] for page in tldr.load_command_index().find("gzip")] == [("linux", "en")]
+
+
+def test_search_pages(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    tldr.store_page_to_cache(
+        b"# tar\n\n> Archiving utility.\n\n- Create a compressed archive of a directory:\n\n`tar czf {{target.tar.gz}} {{path/to/directory}}`\n",
+        "tar", "common", "en"
+    )
+    tldr.store_page_to_cache(
+        b"# ls\n\n> List directory contents.\n\n- List files one per line:\n\n`ls -1`\n",
+        "ls", "common", "en"
+    )
+    tldr.store_page_to_cache(b"# mkdir\n\n> Create directories.\n", "mkdir", "linux", "en")
+
+    results = tldr.search_pages("compress a directory", platforms=["common"], language=["en"])
+    assert [result[0] for result in results] == ["tar", "ls"]
+    assert results[0][1:4] == ("common", "en", "Archiving utility.")
+    assert tldr.search_pages("archiving", platforms=["linux"], language=["en"]) == []
+
+    # A page downloaded on its own does not make the next search read every page
+    tldr.store_page_to_cache(b"# zip\n\n> Package and compress files.\n", "zip", "common", "en")
+    assert tldr.open_search_index(["en"]) is not None
+    # The index is rebuilt once the cache is updated
+    tldr.get_update_stamp_path("en").touch()
+    assert tldr.open_search_index(["en"]) is None
+    assert "zip" in [result[0] for result in tldr.search_pages("compress", ["common"], ["en"])]
+    assert tldr.open_search_index(["en"]) is not None
+
+    # Command names containing the query come first, even for a single letter
+    tldr.store_page_to_cache(b"# gunzip\n\n> Decompress files.\n", "gunzip", "common", "en")
+    tldr.get_update_stamp_path("en").touch()
+    assert [result[0] for result in tldr.search_pages("zip", ["common"], ["en"])] == ["zip", "gunzip"]
+    assert [result[0] for result in tldr.search_pages("r", ["common", "linux"], ["en"])] == ["mkdir", "tar"]
+    assert len(tldr.search_pages("", ["common", "linux"], ["en"])) == 5
+
+
+def test_search_limit(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    with mock.patch("sys.argv", ["tldr", "--search", "tool", "-p", "common", "-L", "en"]):
+        tldr.main()
+    assert capsys.readouterr().out == "Update cache, no commands to check from.\n"
+
+    for number in range(tldr.SEARCH_RESULTS + 5):
+        tldr.store_page_to_cache(f"# tool{number}\n\n> Convert images.\n".encode(), f"tool{number}", "common", "en")
+        tldr.store_page_to_cache(f"# app{number}\n\n> Convert images.\n".encode(), f"app{number}", "common", "en")
+
+    # Every name match is listed, and the cut of the other matches is told
+    with mock.patch("sys.argv", ["tldr", "--search", "tool", "-p", "common", "-L", "en"]):
+        tldr.main()
+    out = capsys.readouterr().out.splitlines()
+    assert len(out) == 1 + tldr.SEARCH_RESULTS + 5
+    with mock.patch("sys.argv", ["tldr", "--search", "convert", "-p", "common", "-L", "en"]):
+        tldr.main()
+    out = capsys.readouterr().out.splitlines()
+    assert len(out) == 1 + tldr.SEARCH_RESULTS + 1
+    assert out[-1] == f"{2 * (tldr.SEARCH_RESULTS + 5) - tldr.SEARCH_RESULTS} more pages match, refine the search term to see them."
+
+
+@pytest.mark.parametrize("source, target, expected", [
+    ("gti", "git", 1),
+    ("tar", "tar", 0),
+    ("kitten", "sitting", 3),
+    ("ca", "abc", 3),
+])
+def test_get_edit_distance(source, target, expected):
+    assert tldr.get_edit_distance(source, target) == expected
+
+
+def test_suggestions(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setattr(tldr, "PAGES_SOURCE_LOCATION", (tmp_path / "pages").as_uri())
+    for command in ("git", "gist", "tar", "grep"):
+        tldr.store_page_to_cache(f"# {command}".encode(), command, "common", "en")
+
+    assert tldr.get_suggestions("gti") == ["git"]
+    assert tldr.get_suggestions("gits") == ["gist", "git"]
+    assert tldr.get_suggestions("73eb6f19cd6f") == []
+
+    with mock.patch("sys.argv", ["tldr", "--source", (tmp_path / "pages").as_uri(), "gti"]):
+        with pytest.raises(SystemExit) as exit_info:
+            tldr.main()
+    assert "documentation is not available.\nDid you mean: git?\n" in str(exit_info.value)
+
+
+def test_update_cache_files(monkeypatch, tmp_path, capsys):
+    archive = tmp_path / "tldr-pages.en.zip"
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("common/tar.md", "# tar\n")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setattr(tldr, "DOWNLOAD_CACHE_LOCATION", (tmp_path / "tldr.zip").as_uri())
+
+    tldr.update_cache()
+
+    assert tldr.load_page_from_cache("tar", "common", "en") == b"# tar\n"
+    out = capsys.readouterr().out
+    assert "Updated cache for language en: 1 entries (1 added, 0 changed, 0 removed, 0 unchanged)" in out
+    assert "Cache update took" in out
+    # The spooled archive is removed once extracted
+    assert sorted(p.name for p in (tmp_path / ".cache" / "tldr").iterdir()) == [
+        "commands.idx", "pages", "pages.lock", "pages.manifest", "pages.updated", "search.idx", "suggestions.idx"
+    ]
+
+
+def test_atomic_file(tmp_path):
+    path = tmp_path / "commands.idx"
+    path.write_bytes(b"old")
+    with pytest.raises(ValueError):
+        with tldr.AtomicFile(path) as index_file:
+            index_file.write(b"partial")
+            raise ValueError
+    assert path.read_bytes() == b"old"
+    with tldr.AtomicFile(path, sync=True) as index_file:
+        index_file.write(b"new")
+        # Readers keep seeing the old contents until the file is closed
+        assert path.read_bytes() == b"old"
+    assert path.read_bytes() == b"new"
+    assert [p.name for p in tmp_path.iterdir()] == ["commands.idx"]
+
+
+def test_update_lock(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(tldr, "DOWNLOAD_CACHE_LOCATION", (tmp_path / "missing.zip").as_uri())
+    results = []
+    with tldr.UpdateLock("en") as lock:
+        assert not lock.waited
+        updater = threading.Thread(target=lambda: results.append(tldr.update_language_cache("en")))
+        updater.start()
+        time.sleep(0.1)
+        assert updater.is_alive()
+        # Another updater finishes while this one waits for the lock
+        tldr.get_update_stamp_path("en").touch()
+    updater.join()
+    # So it does not download the archive again
+    assert results == [None]
+
+
+def test_update_lock_without_fcntl(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    # As on Windows, where the lock only keeps the threads of a process apart
+    monkeypatch.setitem(sys.modules, "fcntl", None)
+    with tldr.UpdateLock("en") as lock:
+        assert not lock.waited
+        assert lock.path == tmp_path / ".cache" / "tldr" / "pages.lock"
+        assert lock.path.is_file()
+        other = tldr.UpdateLock("en")
+        waiter = threading.Thread(target=other.acquire)
+        waiter.start()
+        time.sleep(0.1)
+        assert waiter.is_alive()
+    waiter.join()
+    assert other.waited
+    other.release()
+
+
+def test_build_system_cache(monkeypatch, tmp_path, capsys):
+    with zipfile.ZipFile(tmp_path / "tldr-pages.en.zip", "w") as zip_file:
+        zip_file.writestr("common/tar.md", "# tar\n\n> Archiving utility.\n")
+        zip_file.writestr("linux/apt.md", "# apt\n\n> Package manager.\n")
+    system_dir = tmp_path / "share" / "tldr"
+    system_dir.mkdir(parents=True)
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.setenv("XDG_DATA_DIRS", str(tmp_path / "share"))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setattr(tldr, "DOWNLOAD_CACHE_LOCATION", (tmp_path / "tldr.zip").as_uri())
+    monkeypatch.setattr(tldr, "PAGES_SOURCE_LOCATION", (tmp_path / "missing").as_uri())
+
+    tldr.build_system_cache()
+
+    assert "Built system cache for language en: 2 entries" in capsys.readouterr().out
+    assert sorted(p.name for p in system_dir.iterdir()) == [
+        "commands.idx", "pages.lock", "pages.pack", "search.idx", "suggestions.idx"
+    ]
+    # Users without a cache of their own read every page from it
+    assert tldr.get_page_for_every_platform("tar", platforms=["linux"], languages=["en"]) == [
+        ([b"# tar", b"", b"> Archiving utility."], "common")
+    ]
+    assert tldr.get_commands(["linux", "common"], ["en"]) == ["apt", "tar"]
+    assert [result[0] for result in tldr.search_pages("package")] == ["apt"]
+    assert tldr.get_suggestions("tra") == ["tar"]
+    assert not (tmp_path / "home").exists()
+
+    # A page in the user cache overrides the one of the system cache
+    tldr.store_page_to_cache(b"# tar (user)\n", "tar", "common", "en")
+    assert tldr.get_page_for_every_platform("tar", platforms=["linux"], languages=["en"]) == [
+        ([b"# tar (user)"], "common")
+    ]
+    assert tldr.get_commands(["linux", "common"], ["en"]) == ["apt", "tar"]
+
+
+def test_build_system_cache_errors(monkeypatch, tmp_path, capsys):
+    with zipfile.ZipFile(tmp_path / "tldr-pages.en.zip", "w") as zip_file:
+        zip_file.writestr("common/tar.md", "# tar\n")
+    system_dir = tmp_path / "share" / "tldr"
+    monkeypatch.setattr(tldr, "get_system_cache_dir", lambda: system_dir)
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setattr(tldr, "DOWNLOAD_CACHE_LOCATION", (tmp_path / "tldr.zip").as_uri())
+
+    # The directory cannot be created
+    (tmp_path / "share").write_text("")
+    with pytest.raises(SystemExit) as exit_info:
+        tldr.build_system_cache(["en"])
+    assert str(exit_info.value).startswith(f"Error: Unable to create system cache directory {system_dir}: ")
+    (tmp_path / "share").unlink()
+
+    # The pages cannot be written, so nothing is built
+    system_dir.mkdir(parents=True)
+
+    def write_page_pack(zipfile, pages, path):
+        raise PermissionError(13, "Permission denied", str(path))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(tldr, "write_page_pack", write_page_pack)
+        with pytest.raises(SystemExit) as exit_info:
+            tldr.build_system_cache(["en"])
+    assert str(exit_info.value) == f"Error: No language was written to the system cache in {system_dir}"
+    out = capsys.readouterr().out
+    assert "Error: Unable to write system cache for language en: [Errno 13] Permission denied" in out
+    assert "System cache written" not in out
+    assert not (system_dir / "commands.idx").exists()
+
+    # The archives cannot be downloaded
+    (tmp_path / "tldr-pages.en.zip").unlink()
+    with pytest.raises(SystemExit):
+        tldr.build_system_cache(["fr"])
+    assert "Error: Unable to update cache for language fr from " in capsys.readouterr().out
+    assert sorted(path.name for path in system_dir.iterdir()) == ["pages.fr.lock", "pages.lock"]
+
+
+def test_update_cache_jobs(monkeypatch, tmp_path, capsys):
+    with zipfile.ZipFile(tmp_path / "tldr-pages.en.zip", "w") as zip_file:
+        zip_file.writestr("common/tar.md", "# tar\n")
+    with zipfile.ZipFile(tmp_path / "tldr-pages.de.zip", "w") as zip_file:
+        zip_file.writestr("common/tar.md", "# tar (de)\n")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LANGUAGE", "fr:de")
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setenv("LANG", "de_DE")
+    monkeypatch.setattr(tldr, "DOWNLOAD_CACHE_LOCATION", (tmp_path / "tldr.zip").as_uri())
+
+    tldr.update_cache(jobs=3)
+
+    out = capsys.readouterr().out
+    # A language that fails to download does not stop the others
+    assert "Error: Unable to update cache for language fr" in out
+    assert "Updated cache for language de: 1 entries" in out
+    assert "Updated cache for language en: 1 entries" in out
+    assert tldr.load_page_from_cache("tar", "common", "de") == b"# tar (de)\n"
+
+
+@pytest.fixture
+def http_directory(tmp_path):
+    """Serve tmp_path over HTTP, with Last-Modified and If-Modified-Since support."""
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        functools.partial(Handler, directory=str(tmp_path))
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_refresh_in_background(monkeypatch, tmp_path, http_directory):
+    (tmp_path / "pages" / "common").mkdir(parents=True)
+    (tmp_path / "pages" / "common" / "tar.md").write_bytes(b"# tar (updated)\n")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(tldr, "CACHE_REFRESH", "background")
+    monkeypatch.setattr(tldr, "PAGES_SOURCE_LOCATION", f"{http_directory}/pages")
+    tldr.store_page_to_cache(b"# tar\n", "tar", "common", "en")
+    page = tldr.get_cache_file_path("tar", "common", "en")
+    os.utime(page, (0, 0))
+
+    # The stale page is shown without waiting for the network
+    assert tldr.get_page_for_platform("tar", "common", None, "en") == [b"# tar"]
+    # And refreshed by a detached process, only once
+    assert tldr.get_page_for_platform("tar", "common", None, "en") == [b"# tar"]
+    assert not tldr.claim_refresh("tar", "common", "en")
+    for _ in range(100):
+        if page.read_bytes() == b"# tar (updated)\n":
+            break
+        time.sleep(0.05)
+    assert page.read_bytes() == b"# tar (updated)\n"
+    assert tldr.get_cache_state("tar", "common", "en") == "hit"
+
+
+def test_claim_refresh(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    marker = tldr.get_refresh_marker_path("tar", "common", "en")
+    assert tldr.claim_refresh("tar", "common", "en")
+    assert not tldr.claim_refresh("tar", "common", "en")
+
+    # An out of date marker is claimed by one lookup only
+    os.utime(marker, (0, 0))
+    assert tldr.claim_refresh("tar", "common", "en")
+    assert not tldr.claim_refresh("tar", "common", "en")
+
+    # Not while another lookup holds the marker to claim it
+    fcntl = pytest.importorskip("fcntl")
+    os.utime(marker, (0, 0))
+    with marker.open("a") as marker_file:
+        fcntl.flock(marker_file, fcntl.LOCK_EX)
+        assert not tldr.claim_refresh("tar", "common", "en")
+    assert tldr.claim_refresh("tar", "common", "en")
+
+
+def test_update_cache_not_modified(monkeypatch, tmp_path, http_directory, capsys):
+    with zipfile.ZipFile(tmp_path / "tldr-pages.en.zip", "w") as zip_file:
+        zip_file.writestr("common/tar.md", "# tar\n")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setattr(tldr, "DOWNLOAD_CACHE_LOCATION", f"{http_directory}/tldr.zip")
+
+    tldr.update_cache()
+    assert "Updated cache for language en: 1 entries" in capsys.readouterr().out
+    assert f"{http_directory}/tldr-pages.en.zip" in tldr.load_validators()
+
+    page = tldr.get_cache_file_path("tar", "common", "en")
+    os.utime(page, (0, 0))
+    tldr.update_cache()
+    assert "Cache for language en is already up to date" in capsys.readouterr().out
+    # The page is not rewritten, but counts as fresh again
+    assert page.stat().st_mtime == 0
+    assert tldr.have_recent_cache("tar", "common", "en")
+
+
+@pytest.mark.parametrize("previous_format, cache_format", [
+    ("files", "pack"), ("files", "zip"), ("pack", "compressed"), ("compressed", "pack"), ("zip", "files"),
+])
+def test_update_cache_format_change(previous_format, cache_format, monkeypatch, tmp_path, http_directory, capsys):
+    with zipfile.ZipFile(tmp_path / "tldr-pages.en.zip", "w") as zip_file:
+        zip_file.writestr("common/tar.md", "# tar\n")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setattr(tldr, "DOWNLOAD_CACHE_LOCATION", f"{http_directory}/tldr.zip")
+    monkeypatch.setattr(tldr, "CACHE_FORMAT", previous_format)
+    tldr.update_cache()
+
+    # The archive did not change, but the cache has no store in the new format yet
+    monkeypatch.setattr(tldr, "CACHE_FORMAT", cache_format)
+    capsys.readouterr()
+    tldr.update_cache()
+    assert "Updated cache for language en: 1 entries" in capsys.readouterr().out
+    assert tldr.is_language_cached("en")
+    tldr.update_cache()
+    assert "Cache for language en is already up to date" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("cache_format", ["files", "pack", "compressed", "zip"])
+def test_update_cache_incremental(cache_format, monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setattr(tldr, "CACHE_FORMAT", cache_format)
+    monkeypatch.setattr(tldr, "DOWNLOAD_CACHE_LOCATION", (tmp_path / "tldr.zip").as_uri())
+    with zipfile.ZipFile(tmp_path / "tldr-pages.en.zip", "w") as zip_file:
+        zip_file.writestr("common/tar.md", "# tar\n")
+        zip_file.writestr("common/git.md", "# git\n")
+        zip_file.writestr("linux/apt.md", "# apt\n")
+    tldr.update_cache()
+    git = tldr.get_cache_file_path("git", "common", "en")
+    if cache_format == "files":
+        os.utime(git, (0, 0))
+
+    with zipfile.ZipFile(tmp_path / "tldr-pages.en.zip", "w") as zip_file:
+        zip_file.writestr("common/tar.md", "# tar (updated)\n")
+        zip_file.writestr("common/git.md", "# git\n")
+        zip_file.writestr("linux/lspci.md", "# lspci\n")
+    capsys.readouterr()
+    tldr.update_cache()
+
+    assert "3 entries (1 added, 1 changed, 1 removed, 1 unchanged)" in capsys.readouterr().out
+    assert tldr.load_page_from_cache("tar", "common", "en") == b"# tar (updated)\n"
+    assert tldr.load_page_from_cache("lspci", "linux", "en") == b"# lspci\n"
+    assert tldr.load_page_from_cache("apt", "linux", "en") is None
+    if cache_format == "files":
+        # Unchanged pages are left untouched
+        assert git.stat().st_mtime == 0
+        # Unless they were deleted or damaged since
+        git.unlink()
+        tldr.get_cache_file_path("tar", "common", "en").write_bytes(b"# tar")
+        tldr.update_cache()
+        assert "3 entries (0 added, 2 changed, 0 removed, 1 unchanged)" in capsys.readouterr().out
+        assert tldr.load_page_from_cache("git", "common", "en") == b"# git\n"
+        assert tldr.load_page_from_cache("tar", "common", "en") == b"# tar (updated)\n"
+    if cache_format == "zip":
+        # The archive is kept as downloaded, and nothing else
+        assert sorted(p.name for p in (tmp_path / ".cache" / "tldr").glob("pages*")) == [
+            "pages.lock", "pages.updated", "pages.zip"
+        ]
+
+
+def test_get_page_for_every_platform_network(monkeypatch):
+    pages = {("linux", "de"): 0.2, ("linux", "en"): 0, ("common", "en"): 0.1, ("osx", "en"): 0}
+    probed = []
+
+    def get_page_for_platform(command, platform, remote, language, timeout):
+        probed.append((platform, language))
+        if (platform, language) not in pages:
+            raise HTTPError("url", 404, "Not Found", {}, None)
+        time.sleep(pages[(platform, language)])
+        return [f"{platform}.{language}".encode()]
+
+    monkeypatch.setattr(tldr, "USE_CACHE", False)
+    monkeypatch.setattr(tldr, "get_page_for_platform", get_page_for_platform)
+
+    start = time.monotonic()
+    result = tldr.get_page_for_every_platform(
+        "tar", platforms=["linux", "common", "osx"], languages=["de", "en"]
+    )
+    # Probes run concurrently, but results keep the order of priority
+    assert time.monotonic() - start < 0.3
+    assert result == [([b"linux.de"], "linux"), ([b"common.en"], "common"), ([b"osx.en"], "osx")]
+    # A platform's next language is only asked for when the preferred one has no page
+    assert sorted(probed) == [("common", "de"), ("common", "en"), ("linux", "de"), ("osx", "de"), ("osx", "en")]
+
+    assert tldr.get_page_for_every_platform("tar", platforms=["windows"], languages=["fr"]) is False
+
+
+def test_get_page_for_every_platform_network_timeout(monkeypatch):
+    probed = []
+
+    def get_page_for_platform(command, platform, remote, language, timeout):
+        probed.append(language)
+        time.sleep(0.3)
+        raise HTTPError("url", 404, "Not Found", {}, None)
+
+    monkeypatch.setattr(tldr, "USE_CACHE", False)
+    monkeypatch.setattr(tldr, "NETWORK_TIMEOUT", 0.1)
+    monkeypatch.setattr(tldr, "get_page_for_platform", get_page_for_platform)
+
+    with pytest.raises(URLError):
+        tldr.get_page_for_every_platform("tar", platforms=["linux"], languages=["de", "en"])
+    # Nothing more is downloaded once the answer is given up on
+    time.sleep(0.4)
+    assert set(probed) == {"de"}
+
+
+def test_get_page_for_every_platform_network_error(monkeypatch):
+    def get_page_for_platform(command, platform, remote, language, timeout):
+        raise HTTPError("url", 500 if platform == "linux" else 404, "Error", {}, None)
+
+    monkeypatch.setattr(tldr, "USE_CACHE", False)
+    monkeypatch.setattr(tldr, "get_page_for_platform", get_page_for_platform)
+
+    with pytest.raises(HTTPError) as error:
+        tldr.get_page_for_every_platform("tar", platforms=["linux", "common"], languages=["en"])
+    assert error.value.code == 500
+
+
+def test_tldr_client(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(tldr, "PAGES_SOURCE_LOCATION", (tmp_path / "pages").as_uri())
+    for command in ("tar", "git", "ls"):
+        tldr.store_page_to_cache(f"# {command}\n> Page of {command}.".encode(), command, "common", "en")
+    client = tldr.TldrClient(platforms=["linux"], languages=["en"], max_pages=2)
+
+    assert client.get_page_for_every_platform("tar") == [([b"# tar", b"> Page of tar."], "common")]
+    with mock.patch("tldr.load_page_from_cache") as load_page_from_cache:
+        assert client.get_page_for_every_platform("tar")[0][1] == "common"
+    load_page_from_cache.assert_not_called()
+    assert (client.hits, client.misses) == (1, 1)
+    assert client.get_parsed_page("tar").title == "tar"
+    assert client.get_parsed_page("73eb6f19cd6f") is None
+
+    # The least recently used page goes first
+    client.get_page_for_every_platform("git")
+    client.get_page_for_every_platform("ls")
+    client.get_page_for_every_platform("tar")
+    assert (client.hits, client.misses) == (2, 7)
+
+    client = tldr.TldrClient(platforms=["linux"], languages=["en"], max_bytes=30)
+    client.get_page("tar")
+    client.get_page("git")
+    client.get_page("tar")
+    assert (client.hits, client.misses) == (0, 3)
+
+
+def test_tldr_client_threads():
+    client = tldr.TldrClient(platforms=["linux"], languages=["en"], max_pages=8, max_bytes=100)
+
+    def use(thread):
+        for i in range(2000):
+            key = ("page", (thread + i) % 16)
+            if client._lookup(key) is None:
+                client._store(key, [b"page"], 10)
+
+    threads = [threading.Thread(target=use, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(client._pages) <= 8
+    assert client._bytes == sum(size for _, size, _ in client._pages.values())
+    assert client.hits + client.misses == 8000
+
+
+def test_get_page_async(monkeypatch, tmp_path, http_directory):
+    (tmp_path / "pages" / "common").mkdir(parents=True)
+    (tmp_path / "pages" / "common" / "tar.md").write_bytes(b"# tar\n> Archiver.\n")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(tldr, "PAGES_SOURCE_LOCATION", f"{http_directory}/pages")
+
+    result = asyncio.run(tldr.get_page_for_every_platform_async(
+        "tar", platforms=["linux"], languages=["de", "en"]
+    ))
+    assert result == [([b"# tar", b"> Archiver."], "common")]
+    assert tldr.load_page_from_cache("tar", "common", "en") == b"# tar\n> Archiver.\n"
+    # Served from the cache from now on
+    with mock.patch("tldr.open_url_async") as open_url_async:
+        assert asyncio.run(tldr.get_page_async("tar", platforms=["linux", "common"])) == [
+            b"# tar", b"> Archiver."
+        ]
+    open_url_async.assert_not_called()
+
+    assert asyncio.run(tldr.get_page_async("73eb6f19cd6f", platforms=["linux"], languages=["en"])) is False
+
+
+def test_get_page_for_every_platform_async_jobs(monkeypatch):
+    running = set()
+    peak = []
+    probed = []
+
+    async def get_page_for_platform_async(command, platform, remote, language, timeout):
+        probed.append((platform, language))
+        running.add((platform, language))
+        peak.append(len(running))
+        await asyncio.sleep(0.05)
+        running.remove((platform, language))
+        if language == "de" or platform != "common":
+            raise HTTPError("url", 404, "Not Found", {}, None)
+        return [b"# tar"]
+
+    monkeypatch.setattr(tldr, "NETWORK_JOBS", 2)
+    monkeypatch.setattr(tldr, "get_page_for_platform_async", get_page_for_platform_async)
+    platforms = ["linux", "osx", "windows", "android", "common"]
+
+    result = asyncio.run(tldr.get_page_for_every_platform_async(
+        "73eb6f19cd6f", platforms=platforms, languages=["de", "en"]
+    ))
+    assert result == [([b"# tar"], "common")]
+    assert len(probed) == 10
+    # No more downloads run at a time than the thread pool has threads
+    assert max(peak) == 2
+
+
+def test_update_cache_async(monkeypatch, tmp_path, http_directory, capsys):
+    with zipfile.ZipFile(tmp_path / "tldr-pages.en.zip", "w") as zip_file:
+        zip_file.writestr("common/tar.md", "# tar\n")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setattr(tldr, "DOWNLOAD_CACHE_LOCATION", f"{http_directory}/tldr.zip")
+
+    asyncio.run(tldr.update_cache_async(["fr"]))
+    out = capsys.readouterr().out
+    assert "Updated cache for language en: 1 entries (1 added" in out
+    assert "Error: Unable to update cache for language fr" in out
+    assert tldr.load_page_from_cache("tar", "common", "en") == b"# tar\n"
+    assert tldr.get_commands(["common"], ["en"]) == ["tar"]
+
+    asyncio.run(tldr.update_cache_async())
+    assert "Cache for language en is already up to date" in capsys.readouterr().out
+
+
+def test_open_url_async_no_body():
+    async def respond(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        # The connection stays open, so reading the announced body would never end
+        writer.write(
+            b"HTTP/1.1 100 Continue\r\n\r\n"
+            b"HTTP/1.1 304 Not Modified\r\nContent-Length: 1234\r\n\r\n"
+        )
+        await writer.drain()
+        await asyncio.sleep(5)
+        writer.close()
+
+    async def fetch():
+        server = await asyncio.start_server(respond, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            with pytest.raises(HTTPError) as error:
+                await asyncio.wait_for(tldr.open_url_async(tldr.get_request(f"http://127.0.0.1:{port}/tldr.zip")), 2)
+            assert error.value.code == 304
+        finally:
+            server.close()
+
+    asyncio.run(fetch())
+
+
+def test_connection_pool(tmp_path, http_directory):
+    (tmp_path / "tar.md").write_bytes(b"# tar\n")
+    pool = tldr.ConnectionPool()
+    request = tldr.get_request(f"{http_directory}/tar.md")
+    key = ("http", "127.0.0.1", int(http_directory.rsplit(":", 1)[1]))
+
+    with pool.open(request, timeout=5) as response:
+        assert response.read() == b"# tar\n"
+    connection = pool._idle[key][0]
+
+    # The same connection serves the next request
+    with pool.open(request, timeout=5) as response:
+        assert response.read() == b"# tar\n"
+    assert pool._idle[key] == [connection]
+
+    with pytest.raises(HTTPError) as error:
+        pool.open(tldr.get_request(f"{http_directory}/missing.md"), timeout=5)
+    assert error.value.code == 404
+
+    # A directory redirects to its url with a slash, which lists it
+    (tmp_path / "pages").mkdir()
+    with pool.open(tldr.get_request(f"{http_directory}/pages"), timeout=5) as response:
+        assert b"Directory listing" in response.read()
+    status, _, body = asyncio.run(tldr.open_url_async(tldr.get_request(f"{http_directory}/pages"), timeout=5))
+    assert status == 200 and b"Directory listing" in body
+    pool.close()
+
+
+def test_batch(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setattr(tldr, "PAGES_SOURCE_LOCATION", (tmp_path / "pages").as_uri())
+    tldr.store_page_to_cache(b"# tar", "tar", "common", "en")
+    tldr.store_page_to_cache(b"# git commit", "git-commit", "common", "en")
+    batch = tmp_path / "commands.txt"
+    batch.write_text("tar\n\ngit commit\n73eb6f19cd6f\n")
+
+    with mock.patch("sys.argv", ["tldr", "--markdown", "--batch", str(batch)]):
+        with pytest.raises(SystemExit) as exit_info:
+            tldr.main()
+
+    assert exit_info.value.code == 1
+    out, err = capsys.readouterr()
+    assert out == "==> tar <==\n# tar\n\n==> git-commit <==\n# git commit\n\n==> 73eb6f19cd6f <==\n"
+    assert err == "`73eb6f19cd6f` documentation is not available.\n"
+
+    missing = tmp_path / "missing.txt"
+    with mock.patch("sys.argv", ["tldr", "--batch", str(missing)]):
+        with pytest.raises(SystemExit) as exit_info:
+            tldr.main()
+    assert exit_info.value.code == f"Error: Unable to read {missing}: No such file or directory"
+
+
+def test_profile(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    tldr.store_page_to_cache(b"# tar\n\n> Archiver.", "tar", "common", "en")
+
+    monkeypatch.setenv("TLDR_TRACE", "json")
+    with mock.patch("sys.argv", ["tldr", "--platform", "linux", "tar"]):
+        tldr.main()
+    spans = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+    assert [span["span"] for span in spans] == [
+        "startup", "server", "user cache", "command index", "lookup", "cache stat", "parse", "render"
+    ]
+    lookup = spans[4]
+    assert lookup == {**lookup, "platform": "common", "language": "en", "outcome": "hit", "bytes": 18}
+
+    monkeypatch.delenv("TLDR_TRACE")
+    with mock.patch("sys.argv", ["tldr", "--profile", "--platform", "linux", "tar"]):
+        tldr.main()
+    err = capsys.readouterr().err
+    assert err.startswith("tldr trace: ")
+    assert "    lookup" in err and "common/en        hit" in err
+
+    with mock.patch("sys.argv", ["tldr", "tar"]):
+        tldr.main()
+    assert capsys.readouterr().err == ""
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+def test_serve(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    monkeypatch.setattr(tldr, "SERVER_TIMEOUT", 0.2)
+    tldr.store_page_to_cache(b"# tar", "tar", "common", "en")
+    path = tldr.get_server_socket_path()
+    threading.Thread(target=tldr.serve, daemon=True).start()
+    for _ in range(100):
+        if path.exists():
+            break
+        time.sleep(0.01)
+
+    response = tldr.request_server(["--markdown", "tar"])
+    assert response == {"status": 0, "stdout": "# tar\n\n", "stderr": ""}
+    assert tldr.request_server(["--list"])["stdout"] == "tar\n"
+    # Settings the server read at startup are not the client's, so it looks the page up itself
+    monkeypatch.setenv("TLDR_CACHE_ENABLED", "0")
+    assert tldr.request_server(["--markdown", "tar"]) is None
+    monkeypatch.delenv("TLDR_CACHE_ENABLED")
+    # Only lookups, listings and searches are answered
+    for args in (["--update"], ["--clear-cache"], ["--serve"], ["--batch", "-"], ["-r", "tar.md"], ["--version"], ["--bogus"]):
+        assert tldr.request_server(args) is None
+
+    # A client that sends nothing does not hold up the others
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle:
+        idle.connect(str(path))
+        start = time.monotonic()
+        assert tldr.request_server(["--list"])["stdout"] == "tar\n"
+        assert time.monotonic() - start < 2
+    assert tldr.request_server(["--list"])["stdout"] == "tar\n"
+
+    # The server sees pages added after it started
+    tldr.store_page_to_cache(b"# git", "git", "common", "en")
+    with mock.patch("sys.argv", ["tldr", "--markdown", "git"]):
+        with pytest.raises(SystemExit) as exit_info:
+            tldr.main()
+    assert exit_info.value.code == 0
+    assert capsys.readouterr().out.endswith("# git\n\n")
+
+
+def test_parse_page():
+    with open("tests/data/jq.md", "rb") as f_original:
+        page = tldr.parse_page(f_original)
+
+    assert page.title == "jq"
+    assert page.description[0] == " A command-line JSON processor that uses a domain-specific language."
+    assert len(page.examples) == 8
+    assert page.examples[0].command == [
+        tldr.Token("command", "jq . "), tldr.Token("parameter", "file.json"), tldr.Token("command", "")
+    ]
+    assert tldr.Page.from_json(page.to_json()) == page
+
+    tokens = tldr.parse_command("tar {{[-x|--extract]}}f {{path/to/file}}")
+    assert tokens[1] == tldr.Token("option", "[-x|--extract]", "-x", "--extract")
+    assert tldr.render_command(tokens, "short")[0] == ("command", "tar -xf ")
+    assert tldr.render_command(tokens, "long")[0] == ("command", "tar --extractf ")
+    assert tldr.render_command(tokens, "both")[1] == ("parameter", "[-x|--extract]")
+
+
+def test_get_parsed_page(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(tldr, "_PARSED_PAGES", OrderedDict())
+    monkeypatch.setattr(tldr, "PARSED_PAGES_SIZE", 2)
+    with open("tests/data/gem.md", "rb") as f_original:
+        page = f_original.read().splitlines()
+
+    parsed = tldr.get_parsed_page(page)
+    assert parsed == tldr.parse_page(page)
+    assert tldr.get_parsed_page(page) is parsed
+    assert not (tmp_path / ".cache" / "tldr" / "parsed").exists()
+
+    # The least recently used pages are dropped past the size bound
+    tar = tldr.get_parsed_page(b"# tar\n\n> Archiver.\n".splitlines())
+    tldr.get_parsed_page(page)
+    tldr.get_parsed_page(b"# zip\n\n> Archiver.\n".splitlines())
+    assert len(tldr._PARSED_PAGES) == 2
+    assert tldr.get_parsed_page(page) is parsed
+    assert tldr.get_parsed_page(b"# tar\n\n> Archiver.\n".splitlines()) is not tar
+
+
+def test_clear_cache_indexes(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LANG", "C")
+    monkeypatch.delenv("LANGUAGE", raising=False)
+    monkeypatch.delenv("TLDR_LANGUAGE", raising=False)
+    tldr.store_page_to_cache(b"# tar\n\n> Archiver.\n", "tar", "common", "en")
+    tldr.build_indexes()
+    assert (tmp_path / ".cache" / "tldr" / "search.idx").exists()
+    assert tldr.claim_refresh("tar", "common", "en")
+    tldr.store_validators("https://example.com/tar.md", {"ETag": '"1"'})
+
+    tldr.clear_cache()
+    assert "Cleared cache for language en" in capsys.readouterr().out
+    assert not (tmp_path / ".cache" / "tldr" / "commands.idx").exists()
+    assert not (tmp_path / ".cache" / "tldr" / "search.idx").exists()
+    assert not (tmp_path / ".cache" / "tldr" / "refresh").exists()
+    assert not (tmp_path / ".cache" / "tldr" / "validators.json").exists()
+
+
+def test_startup_imports():
+    # Looking up a cached page must not pay for the network, zip, JSON or completion support
+    script = "import sys, tldr; tldr.create_parser(completion=False); print(' '.join(sorted(sys.modules)))"
+    modules = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    ).stdout.split()
+    for module in ("shtab", "ssl", "zipfile", "urllib.request", "http.client", "concurrent.futures", "json", "shutil"):
+        assert module not in modules
+
+
+def test_get_terminal_columns(monkeypatch):
+    monkeypatch.setenv("COLUMNS", "50")
+    assert tldr.get_terminal_columns() == 50
+    assert tldr.TerminalHelpFormatter("tldr")._width == 48
+    monkeypatch.setenv("COLUMNS", "0")
+    monkeypatch.setattr(tldr.os, "get_terminal_size", mock.Mock(side_effect=OSError))
+    assert tldr.get_terminal_columns() == 80
+
+
+@pytest.mark.parametrize("args, expected", [
+    ([], True),
+    (["tar"], False),
+    (["-p", "linux", "tar"], False),
+    (["--print-completion", "bash"], True),
+    (["--print-comp=zsh"], True),
+    (["-mh"], True),
+    (["--", "-h"], False),
+])
+def test_is_completion_needed(args, expected):
+    assert tldr.is_completion_needed(args) == expected
@@ -4,19 +4,25 @@
 import sys
 import os
 import re
-from argparse import ArgumentParser
+import math
+import mmap
+import struct
+from argparse import ArgumentParser, HelpFormatter, Namespace
+from collections import OrderedDict
 from pathlib import Path
-from zipfile import ZipFile
-from datetime import datetime
-from io import BytesIO
-from typing import List, Optional, Tuple, Union
-from urllib.parse import quote
-from urllib.request import urlopen, Request
-from urllib.error import HTTPError, URLError
-from termcolor import colored
-import ssl
-import shtab
-import shutil
+from io import BytesIO, StringIO, TextIOWrapper
+from typing import TYPE_CHECKING, Any, AsyncIterator, BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, TextIO, Tuple, Union
+from urllib.parse import quote, urljoin, urlsplit
+import threading
+import time
+import zlib
+
+# Network, SSL, zip, JSON and completion support are imported where they are
+# used, so looking up a cached page does not pay for them at startup
+if TYPE_CHECKING:
+    import ssl
+    from urllib.request import Request
+    from zipfile import ZipFile, ZipInfo
 
 __version__ = "3.4.4"
 __client_specification__ = "2.3"
@@ -33,17 +39,59 @@ DOWNLOAD_CACHE_LOCATION = os.environ.get(
 
 USE_NETWORK = int(os.environ.get('TLDR_NETWORK_ENABLED', '1')) > 0
 USE_CACHE = int(os.environ.get('TLDR_CACHE_ENABLED', '1')) > 0
+CACHE_FORMAT = os.environ.get('TLDR_CACHE_FORMAT', 'files').strip().lower()
+# The cache formats that store the pages of a language in a single pack
+PACK_FORMATS = ('pack', 'compressed')
+# Suffixes of the files holding every page of a language: packs, and the
+# archives kept as they were downloaded
+PAGE_STORE_SUFFIXES = ('.pack', '.zip')
 MAX_CACHE_AGE = int(os.environ.get('TLDR_CACHE_MAX_AGE', 24*7))
+# With 'background', a page older than MAX_CACHE_AGE is shown at once and
+# downloaded again by a detached process, instead of before it is shown
+CACHE_REFRESH = os.environ.get('TLDR_CACHE_REFRESH', 'sync').strip().lower()
+# A page is refreshed in the background at most this often, in seconds
+REFRESH_INTERVAL = 3600
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Pages missing from the cache are looked up with this many requests at a
+# time, all of which have to finish within the timeout
+NETWORK_JOBS = 8
+NETWORK_TIMEOUT = 10
 CAFILE = None if os.environ.get('TLDR_CERT', None) is None else \
     Path(os.environ.get('TLDR_CERT')).expanduser()
+# The variables read once, above or on first use, with their values then
+STARTUP_ENVIRONMENT = {
+    name: os.environ.get(name) for name in (
+        'TLDR_PAGES_SOURCE_LOCATION', 'TLDR_DOWNLOAD_CACHE_LOCATION', 'TLDR_NETWORK_ENABLED',
+        'TLDR_CACHE_ENABLED', 'TLDR_CACHE_FORMAT', 'TLDR_CACHE_MAX_AGE', 'TLDR_CACHE_REFRESH',
+        'TLDR_CERT', 'TLDR_ALLOW_INSECURE',
+    )
+}
+
+_URLOPEN_CONTEXT = None
+
+
+def get_urlopen_context() -> Optional['ssl.SSLContext']:
+    """Return the SSL context set up by TLDR_ALLOW_INSECURE or TLDR_CERT, if any,
+    creating it on first use."""
+    global _URLOPEN_CONTEXT
+    if _URLOPEN_CONTEXT is None:
+        if int(os.environ.get('TLDR_ALLOW_INSECURE', '0')) == 1:
+            import ssl
+            _URLOPEN_CONTEXT = ssl.create_default_context()
+            _URLOPEN_CONTEXT.check_hostname = False
+            _URLOPEN_CONTEXT.verify_mode = ssl.CERT_NONE
+        elif CAFILE:
+            import ssl
+            _URLOPEN_CONTEXT = ssl.create_default_context(cafile=CAFILE)
+    return _URLOPEN_CONTEXT
+
+
+def __getattr__(name: str) -> Any:
+    # URLOPEN_CONTEXT used to be built at import time
+    if name == 'URLOPEN_CONTEXT':
+        return get_urlopen_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-URLOPEN_CONTEXT = None
-if int(os.environ.get('TLDR_ALLOW_INSECURE', '0')) == 1:
-    URLOPEN_CONTEXT = ssl.create_default_context()
-    URLOPEN_CONTEXT.check_hostname = False
-    URLOPEN_CONTEXT.verify_mode = ssl.CERT_NONE
-elif CAFILE:
-    URLOPEN_CONTEXT = ssl.create_default_context(cafile=CAFILE)
 
 OS_DIRECTORIES = {
     "android": "android",
@@ -64,6 +112,145 @@ class CacheNotExist(Exception):
     pass
 
 
+TRACE_FORMATS = ('summary', 'json')
+
+
+def get_trace_format(value: Optional[str]) -> Optional[str]:
+    """Return the trace format asked for by --profile or TLDR_TRACE, where
+    any value other than json, 0 or empty asks for the summary."""
+    value = (value or '').strip().lower()
+    if value in ('', '0'):
+        return None
+    return value if value in TRACE_FORMATS else 'summary'
+
+
+class Span:
+    """A timed phase of a command, with the platform and language it is for,
+    its outcome and the bytes it read or downloaded."""
+
+    __slots__ = ('tracer', 'name', 'fields', 'start', 'duration', 'parent')
+
+    def __init__(self, tracer: 'Tracer', name: str, fields: Dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+        self.start = 0.0
+        self.duration = 0.0
+        self.parent = None
+
+    def set(self, **fields: Any) -> None:
+        self.fields.update(fields)
+
+    def __enter__(self) -> 'Span':
+        local = self.tracer.local
+        self.parent = getattr(local, 'span', None)
+        local.span = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.duration = time.perf_counter() - self.start
+        self.tracer.local.span = self.parent
+        if exc_type is not None:
+            self.fields.setdefault('outcome', 'error')
+        self.tracer.spans.append(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'span': self.name,
+            'start_ms': round((self.start - self.tracer.start) * 1000, 3),
+            'duration_ms': round(self.duration * 1000, 3),
+            **{key: value for key, value in self.fields.items() if value is not None},
+        }
+
+
+class NullSpan:
+    """Stands in for a span while tracing is off."""
+
+    def set(self, **fields: Any) -> None:
+        pass
+
+    def __enter__(self) -> 'NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    """Collects the spans of a command while tracing is enabled."""
+
+    def __init__(self) -> None:
+        self.format = None
+        self.spans = []
+        self.start = 0.0
+        self.local = threading.local()
+
+    def enable(self, trace_format: str) -> None:
+        self.format = trace_format
+        self.spans = []
+        self.start = time.perf_counter()
+        self.local = threading.local()
+
+    def disable(self) -> None:
+        self.format = None
+
+    def span(self, name: str, **fields: Any) -> Union[Span, NullSpan]:
+        if self.format is None:
+            return NULL_SPAN
+        return Span(self, name, fields)
+
+    def adopt(self, span: Union[Span, NullSpan]) -> None:
+        """Record the next spans of this thread under a span of another thread."""
+        if isinstance(span, Span):
+            self.local.span = span
+
+    def add(self, name: str, duration: float, **fields: Any) -> None:
+        """Record a span that was timed by other means."""
+        span = Span(self, name, fields)
+        span.start = self.start
+        span.duration = duration
+        self.spans.append(span)
+
+    def report(self, file: Optional[TextIO] = None) -> None:
+        import json
+        file = sys.stderr if file is None else file
+        spans = sorted(self.spans, key=lambda span: (span.start, -span.duration))
+        if self.format == 'json':
+            for span in spans:
+                file.write(json.dumps(span.to_dict()) + '\n')
+            return
+        children = {}
+        for span in spans:
+            children.setdefault(id(span.parent) if span.parent is not None else None, []).append(span)
+        total = (time.perf_counter() - self.start) * 1000
+        file.write(f"tldr trace: {total:.2f}ms after startup\n")
+        # Print every span under the one it ran in, depth first
+        stack = [(span, 1) for span in reversed(children.get(None, []))]
+        while stack:
+            span, depth = stack.pop()
+            fields = span.fields
+            where = '/'.join(filter(None, (fields.get('platform'), fields.get('language'))))
+            line = f"{'  ' * depth}{span.name:<{26 - 2 * depth}} {span.duration * 1000:9.3f}ms"
+            line += f"  {where:<16} {fields.get('outcome', ''):<8}"
+            if fields.get('bytes') is not None:
+                line += f" {fields['bytes']:>8} B"
+            file.write(line.rstrip() + '\n')
+            stack.extend((child, depth + 1) for child in reversed(children.get(id(span), [])))
+
+
+TRACER = Tracer()
+
+
+def trace(name: str, **fields: Any) -> Union[Span, NullSpan]:
+    """Return a span timing the phase of a command while tracing is enabled,
+    to be used as a context manager."""
+    return TRACER.span(name, **fields)
+
+
 def get_language_code(language: str) -> str:
     language = language.split('.')[0]
     if language in ['pt_PT', 'pt_BR', 'zh_TW']:
@@ -105,15 +292,1306 @@ def get_system_cache_dir() -> Path:
     return Path('/usr/share/tldr')
 
 
-def get_cache_file_path(command: str, platform: str, language: str, system_cache: bool = False) -> Path:
-    pages_dir = "pages"
+def get_pages_dir(language: Optional[str]) -> str:
     if language and language != 'en':
-        pages_dir += "." + language
+        return f"pages.{language}"
+    return "pages"
+
+
+def get_cache_file_path(command: str, platform: str, language: str, system_cache: bool = False) -> Path:
+    pages_dir = get_pages_dir(language)
     if system_cache:
         return get_system_cache_dir() / pages_dir / platform / f"{command}.md"
     return get_cache_dir() / pages_dir / platform / f"{command}.md"
 
 
+def get_pack_path(language: str, system_cache: bool = False) -> Path:
+    cache_dir = get_system_cache_dir() if system_cache else get_cache_dir()
+    return cache_dir / f"{get_pages_dir(language)}.pack"
+
+
+def get_archive_path(language: str, system_cache: bool = False) -> Path:
+    cache_dir = get_system_cache_dir() if system_cache else get_cache_dir()
+    return cache_dir / f"{get_pages_dir(language)}.zip"
+
+
+def get_temporary_path(path: Path) -> Path:
+    """Return the name to write a file under before moving it into place,
+    unique to the process and thread so concurrent writers never share it."""
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+class AtomicFile:
+    """Writes a file under a temporary name and moves it over ``path`` once
+    closed without error, so readers see the old or the new contents but
+    never a partial file.
+
+    With ``sync``, the contents reach the disk before the move, so a crash
+    cannot leave an empty file in place of the old one either.
+    """
+
+    def __init__(self, path: Path, mode: str = 'wb', sync: bool = False, encoding: Optional[str] = None) -> None:
+        self._path = path
+        self._tmp_path = get_temporary_path(path)
+        self._sync = sync
+        self._file = self._tmp_path.open(mode, encoding=encoding)
+
+    def __enter__(self) -> Any:
+        return self._file
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            try:
+                if self._sync:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                self._file.close()
+                os.replace(self._tmp_path, self._path)
+                return
+            except BaseException:
+                self._discard()
+                raise
+        self._discard()
+
+    def _discard(self) -> None:
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+_UPDATE_LOCKS = {}
+
+
+class UpdateLock:
+    """Lets one updater at a time change the cache of a language.
+
+    The lock is held on a lock file, so it works across processes, such as a
+    cron job and a user running ``tldr --update``. Readers never take it. On
+    systems without ``fcntl``, such as Windows, it only keeps the threads of
+    one process from updating at once.
+    """
+
+    def __init__(self, language: str, system_cache: bool = False) -> None:
+        cache_dir = get_system_cache_dir() if system_cache else get_cache_dir()
+        self.path = cache_dir / f"{get_pages_dir(language)}.lock"
+        self.waited = False
+        self._file = None
+
+    def __enter__(self) -> 'UpdateLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+    def acquire(self) -> None:
+        """Take the lock, waiting while another updater holds it."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            import fcntl
+        except ImportError:
+            # The lock file is still created, so the cache looks the same everywhere
+            self.path.touch()
+            lock = _UPDATE_LOCKS.setdefault(self.path, threading.Lock())
+            self.waited = not lock.acquire(blocking=False)
+            if self.waited:
+                lock.acquire()
+            return
+        self._file = self.path.open('a')
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.waited = True
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+
+    def release(self) -> None:
+        if self._file is None:
+            _UPDATE_LOCKS[self.path].release()
+            return
+        # Closing the lock file releases the lock
+        self._file.close()
+        self._file = None
+
+
+PACK_MAGIC = b'TLDRPACK'
+PACK_VERSION = 1
+# A compressed pack has the length of its dictionary and the dictionary
+# after the header, and every page is raw deflate data compressed with it
+PACK_COMPRESSED_VERSION = 2
+PACK_DICTIONARY_HEADER = struct.Struct('<I')
+# Deflate refers back at most 32 KiB, so a longer dictionary is never used
+PACK_DICTIONARY_SIZE = 32 * 1024
+# Number of pages the dictionary is trained on
+PACK_DICTIONARY_SAMPLE = 2000
+PACK_DICTIONARY_WORD_REGEX = re.compile(rb'\S+\s?')
+# magic, version, number of pages, offset of the index
+PACK_HEADER = struct.Struct('<8sIIQ')
+# key offset, key length, page offset, page length, page CRC32
+PACK_RECORD = struct.Struct('<IIQII')
+
+
+class PagePack:
+    """Memory mapped, read-only view of a packed page store.
+
+    A pack holds every page of one language in a single file: a header,
+    the concatenated pages and an index of fixed size records sorted by
+    their ``platform/command`` key, so a lookup is a binary search over
+    the mapped index followed by a single slice of the page data.
+
+    In a compressed pack, the slice is inflated with the dictionary stored
+    after the header.
+    """
+
+    def __init__(self, path: Path) -> None:
+        with path.open('rb') as pack_file:
+            self._map = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, index_offset = PACK_HEADER.unpack_from(self._map)
+        if magic != PACK_MAGIC or version not in (PACK_VERSION, PACK_COMPRESSED_VERSION):
+            self._map.close()
+            raise ValueError(f"{path} is not a tldr page pack")
+        self.dictionary = None
+        if version == PACK_COMPRESSED_VERSION:
+            length, = PACK_DICTIONARY_HEADER.unpack_from(self._map, PACK_HEADER.size)
+            start = PACK_HEADER.size + PACK_DICTIONARY_HEADER.size
+            self.dictionary = self._map[start:start + length]
+        self._records = index_offset
+        self._keys = index_offset + self._count * PACK_RECORD.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _record(self, index: int) -> Tuple[int, int, int, int, int]:
+        return PACK_RECORD.unpack_from(self._map, self._records + index * PACK_RECORD.size)
+
+    def _key(self, index: int) -> bytes:
+        key_offset, key_length = self._record(index)[:2]
+        start = self._keys + key_offset
+        return self._map[start:start + key_length]
+
+    def _bisect(self, key: bytes) -> int:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get(self, platform: str, command: str) -> Optional[bytes]:
+        key = f"{platform}/{command}".encode('utf-8')
+        index = self._bisect(key)
+        if index == self._count or self._key(index) != key:
+            return None
+        page_offset, page_length = self._record(index)[2:4]
+        page = self._map[page_offset:page_offset + page_length]
+        if self.dictionary is not None:
+            page = zlib.decompressobj(-zlib.MAX_WBITS, zdict=self.dictionary).decompress(page)
+        return page
+
+    def commands(self, platform: str) -> List[str]:
+        prefix = f"{platform}/".encode('utf-8')
+        commands = []
+        index = self._bisect(prefix)
+        while index < self._count:
+            key = self._key(index)
+            if not key.startswith(prefix):
+                break
+            commands.append(key[len(prefix):].decode('utf-8'))
+            index += 1
+        return commands
+
+    def entries(self) -> Iterator[Tuple[str, str, int, int]]:
+        """Yield the platform, command, stored size and CRC32 of every page in the pack."""
+        for index in range(self._count):
+            platform, command = self._key(index).decode('utf-8').split('/', 1)
+            yield (platform, command, *self._record(index)[3:])
+
+    def close(self) -> None:
+        self._map.close()
+
+
+class PagePackWriter:
+    """Writes a packed page store next to its final location and moves it
+    into place on close, so readers only ever see a complete pack.
+
+    With a ``dictionary``, such as one from train_dictionary, every page is
+    compressed with it.
+    """
+
+    def __init__(self, path: Path, dictionary: Optional[bytes] = None) -> None:
+        self._path = path
+        self._tmp_path = get_temporary_path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._dictionary = dictionary
+        self._version = PACK_VERSION if dictionary is None else PACK_COMPRESSED_VERSION
+        self._file = self._tmp_path.open('wb')
+        self._file.write(PACK_HEADER.pack(PACK_MAGIC, self._version, 0, 0))
+        if dictionary is not None:
+            self._file.write(PACK_DICTIONARY_HEADER.pack(len(dictionary)))
+            self._file.write(dictionary)
+        self._entries = []
+
+    def __enter__(self) -> 'PagePackWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            self._tmp_path.unlink(missing_ok=True)
+
+    def add(self, platform: str, command: str, page: bytes) -> None:
+        self.add_file(platform, command, BytesIO(page))
+
+    def add_file(self, platform: str, command: str, source: BinaryIO) -> None:
+        """Copy a page into the pack in chunks, without reading it whole."""
+        key = f"{platform}/{command}".encode('utf-8')
+        page_offset = self._file.tell()
+        crc = 0
+        compressor = None
+        if self._dictionary is not None:
+            compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=self._dictionary)
+        while chunk := source.read(DOWNLOAD_CHUNK_SIZE):
+            # The CRC32 is the one of the page, to compare with the archive
+            crc = zlib.crc32(chunk, crc)
+            self._file.write(chunk if compressor is None else compressor.compress(chunk))
+        if compressor is not None:
+            self._file.write(compressor.flush())
+        self._entries.append((key, page_offset, self._file.tell() - page_offset, crc))
+
+    def close(self) -> None:
+        self._entries.sort()
+        index_offset = self._file.tell()
+        keys = bytearray()
+        for key, page_offset, page_length, crc in self._entries:
+            self._file.write(PACK_RECORD.pack(len(keys), len(key), page_offset, page_length, crc))
+            keys += key
+        self._file.write(keys)
+        self._file.seek(0)
+        self._file.write(PACK_HEADER.pack(PACK_MAGIC, self._version, len(self._entries), index_offset))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        release_page_store(self._path)
+        os.replace(self._tmp_path, self._path)
+
+
+def train_dictionary(pages: Iterable[bytes], size: int = PACK_DICTIONARY_SIZE) -> bytes:
+    """Return a deflate dictionary of the text most shared between the pages.
+
+    The candidates are the lines of the pages and the words in them, scored
+    by the bytes they could save: their length times the number of other
+    pages they appear in. The best ones are put last, nearest to the page,
+    as deflate codes short distances in fewer bits.
+    """
+    counts = {}
+    for page in pages:
+        pieces = set(page.splitlines(keepends=True))
+        pieces.update(PACK_DICTIONARY_WORD_REGEX.findall(page))
+        for piece in pieces:
+            if len(piece) > 3:
+                counts[piece] = counts.get(piece, 0) + 1
+    candidates = sorted(
+        ((count - 1) * len(piece), piece) for piece, count in counts.items() if count > 1
+    )
+    chosen = []
+    dictionary = bytearray()
+    for _, piece in reversed(candidates):
+        if len(dictionary) + len(piece) > size or piece in dictionary:
+            # Too long, or a part of a better piece
+            continue
+        chosen.append(piece)
+        dictionary += piece
+        if len(dictionary) > size - 4:
+            break
+    return b''.join(reversed(chosen))
+
+
+_PAGE_PACKS = {}
+
+
+def open_page_pack(language: str, system_cache: bool = False) -> Optional[PagePack]:
+    """Return the pack for the language, reusing the mapping while the file is unchanged."""
+    path = get_pack_path(language, system_cache)
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    cached = _PAGE_PACKS.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    try:
+        pack = PagePack(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    _PAGE_PACKS[path] = (signature, pack)
+    return pack
+
+
+ZIP_END_SIGNATURE = b'PK\x05\x06'
+ZIP_CENTRAL_SIGNATURE = b'PK\x01\x02'
+# signature, disk numbers, entries on this disk, entries, directory size,
+# directory offset, comment length
+ZIP_END_RECORD = struct.Struct('<4s4H2IH')
+# signature, versions, flags, method, time, date, CRC32, compressed size,
+# size, name length, extra length, comment length, disk, attributes,
+# local header offset
+ZIP_CENTRAL_RECORD = struct.Struct('<4s6H3I5H2I')
+# signature, version, flags, method, time, date, CRC32, compressed size,
+# size, name length, extra length
+ZIP_LOCAL_RECORD = struct.Struct('<4s5H3I2H')
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+
+class PageArchive:
+    """Memory mapped, read-only view of a downloaded pages archive.
+
+    The central directory of the zip file is the index: a lookup searches
+    it for the name of the page, and inflates the page from the offset in
+    its record. The first call to entries maps every name to its record,
+    which later lookups use instead, such as the ones of a server.
+    """
+
+    def __init__(self, path: Path) -> None:
+        with path.open('rb') as archive_file:
+            self._map = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+        # The end record is followed by a comment of at most 64 KiB
+        end = self._map.rfind(ZIP_END_SIGNATURE, max(len(self._map) - ZIP_END_RECORD.size - 0xffff, 0))
+        if end < 0:
+            self._map.close()
+            raise ValueError(f"{path} is not a zip archive")
+        _, _, _, _, self._count, size, self._directory, _ = ZIP_END_RECORD.unpack_from(self._map, end)
+        self._directory_end = self._directory + size
+        if self._directory_end > end:
+            # Such as the offsets of a ZIP64 archive
+            self._map.close()
+            raise ValueError(f"{path} is not a supported zip archive")
+        self._records = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _find(self, name: bytes) -> Optional[tuple]:
+        if self._records is not None:
+            return self._records.get(name)
+        position = self._directory
+        while (position := self._map.find(name, position, self._directory_end)) >= 0:
+            start = position - ZIP_CENTRAL_RECORD.size
+            if start >= self._directory and self._map[start:start + 4] == ZIP_CENTRAL_SIGNATURE:
+                record = ZIP_CENTRAL_RECORD.unpack_from(self._map, start)
+                if record[10] == len(name):
+                    return record
+            position += 1
+        return None
+
+    def _load_records(self) -> Dict[bytes, tuple]:
+        if self._records is None:
+            records = {}
+            start = self._directory
+            for _ in range(self._count):
+                record = ZIP_CENTRAL_RECORD.unpack_from(self._map, start)
+                name_start = start + ZIP_CENTRAL_RECORD.size
+                records[self._map[name_start:name_start + record[10]]] = record
+                start = name_start + record[10] + record[11] + record[12]
+            self._records = records
+        return self._records
+
+    def get(self, platform: str, command: str) -> Optional[bytes]:
+        record = self._find(f"{platform}/{command}.md".encode('utf-8'))
+        if record is None:
+            return None
+        method, compressed_size, offset = record[4], record[8], record[16]
+        name_length, extra_length = ZIP_LOCAL_RECORD.unpack_from(self._map, offset)[-2:]
+        start = offset + ZIP_LOCAL_RECORD.size + name_length + extra_length
+        data = self._map[start:start + compressed_size]
+        if method == ZIP_DEFLATED:
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+        if method == ZIP_STORED:
+            return data
+        # Pages are never compressed otherwise in the archives of tldr
+        return None
+
+    def entries(self) -> Iterator[Tuple[str, str, int, int]]:
+        """Yield the platform, command, size and CRC32 of every page in the archive."""
+        for name, record in sorted(self._load_records().items()):
+            name = name.decode('utf-8')
+            if '/' in name and name.endswith('.md'):
+                platform, command = name[:-len('.md')].rsplit('/', 1)
+                yield platform, command, record[9], record[7]
+
+    def close(self) -> None:
+        self._map.close()
+
+
+_PAGE_ARCHIVES = {}
+
+
+def open_page_archive(language: str, system_cache: bool = False) -> Optional[PageArchive]:
+    """Return the kept archive for the language, reusing the mapping while the file is unchanged."""
+    path = get_archive_path(language, system_cache)
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    cached = _PAGE_ARCHIVES.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    try:
+        archive = PageArchive(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    _PAGE_ARCHIVES[path] = (signature, archive)
+    return archive
+
+
+def release_page_store(path: Path) -> None:
+    """Close the mapping of a pack or kept archive before it is replaced or
+    deleted, as a mapped file cannot be on Windows."""
+    for stores in (_PAGE_PACKS, _PAGE_ARCHIVES):
+        cached = stores.pop(path, None)
+        if cached is not None:
+            cached[1].close()
+
+
+def open_page_stores(language: str, system_cache: bool = False) -> Iterator[Tuple[Path, Union[PagePack, PageArchive]]]:
+    """Yield the path and view of the pack and the kept archive of the language, if any."""
+    pack = open_page_pack(language, system_cache)
+    if pack is not None:
+        yield get_pack_path(language, system_cache), pack
+    archive = open_page_archive(language, system_cache)
+    if archive is not None:
+        yield get_archive_path(language, system_cache), archive
+
+
+COMMAND_INDEX_MAGIC = b'TLDRCIDX'
+COMMAND_INDEX_VERSION = 1
+# magic, version, length of the metadata, number of entries
+COMMAND_INDEX_HEADER = struct.Struct('<8sIII')
+# name offset, name length, platform id, language id, page size, page mtime
+COMMAND_INDEX_RECORD = struct.Struct('<IHBBId')
+
+CommandEntry = Tuple[str, str, str, int, float]
+
+
+def get_command_index_path(system_cache: bool = False) -> Path:
+    cache_dir = get_system_cache_dir() if system_cache else get_cache_dir()
+    return cache_dir / 'commands.idx'
+
+
+def get_language_of_pages_dir(pages_dir: str) -> str:
+    return pages_dir.split('.', 1)[1] if '.' in pages_dir else 'en'
+
+
+def get_source_signature(path: Path) -> str:
+    """Describe the state of a cache directory or pack, used to detect a stale index."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return '-'
+    return f"{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def are_sources_stale(
+    cache_dir: Path,
+    sources: Dict[str, str],
+    languages: Optional[List[str]] = None,
+    suffixes: Tuple[str, ...] = ('',) + PAGE_STORE_SUFFIXES
+) -> bool:
+    """Tell whether the sources of the languages changed since their
+    signatures were recorded, or were added since. The sources are the
+    pages directories with the given suffixes, and the platform directories
+    in them."""
+    for source, signature in sources.items():
+        pages_dir = source.split('/')[0]
+        if pages_dir.endswith(tuple(suffix for suffix in suffixes if suffix)):
+            pages_dir = pages_dir.rsplit('.', 1)[0]
+        if languages is not None and get_language_of_pages_dir(pages_dir) not in languages:
+            continue
+        if get_source_signature(cache_dir / source) != signature:
+            return True
+    for language in languages or []:
+        pages_dir = get_pages_dir(language)
+        for source in (pages_dir + suffix for suffix in suffixes):
+            if source not in sources and (cache_dir / source).exists():
+                return True
+    return False
+
+
+class CommandIndex:
+    """Memory mapped index of every (command, platform, language, size, mtime)
+    in the cache, sorted by command.
+
+    The index records the signature of every directory and pack it was built
+    from, so checking it is up to date costs a few ``stat`` calls instead of
+    a walk over every platform directory.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._cache_dir = path.parent
+        with path.open('rb') as index_file:
+            self._map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_length, self._count = COMMAND_INDEX_HEADER.unpack_from(self._map)
+        if magic != COMMAND_INDEX_MAGIC or version != COMMAND_INDEX_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a tldr command index")
+        start = COMMAND_INDEX_HEADER.size
+        platforms, languages, *sources = \
+            self._map[start:start + meta_length].decode('utf-8').split('\n')
+        self.platforms = platforms.split('\t') if platforms else []
+        self.languages = languages.split('\t') if languages else []
+        self.sources = dict(source.split('\t') for source in sources)
+        self._records = start + meta_length
+        self._names = self._records + self._count * COMMAND_INDEX_RECORD.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def is_stale(self, languages: Optional[List[str]] = None) -> bool:
+        return are_sources_stale(self._cache_dir, self.sources, languages)
+
+    def _record(self, index: int) -> Tuple[bytes, int, int, int, float]:
+        name_offset, name_length, platform, language, size, mtime = \
+            COMMAND_INDEX_RECORD.unpack_from(
+                self._map,
+                self._records + index * COMMAND_INDEX_RECORD.size
+            )
+        start = self._names + name_offset
+        return self._map[start:start + name_length], platform, language, size, mtime
+
+    def entries(self) -> Iterator[CommandEntry]:
+        for index in range(self._count):
+            name, platform, language, size, mtime = self._record(index)
+            yield (
+                name.decode('utf-8'),
+                self.platforms[platform],
+                self.languages[language],
+                size,
+                mtime
+            )
+
+    def find(self, command: str) -> List[Tuple[str, str, int, float]]:
+        """Return the platform, language, size and mtime of every page of the
+        command, found by binary search over the sorted names."""
+        # The UTF-8 bytes of the names sort in the same order as the names
+        name = command.encode('utf-8')
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[0] < name:
+                low = middle + 1
+            else:
+                high = middle
+        pages = []
+        for index in range(low, self._count):
+            record_name, platform, language, size, mtime = self._record(index)
+            if record_name != name:
+                break
+            pages.append((self.platforms[platform], self.languages[language], size, mtime))
+        return pages
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def scan_command_entries(system_cache: bool = False) -> Tuple[List[CommandEntry], Dict[str, str]]:
+    """Walk the cache and return every page it holds, with the signature of
+    each directory and pack that was read."""
+    cache_dir = get_system_cache_dir() if system_cache else get_cache_dir()
+    entries = []
+    sources = {}
+    if not cache_dir.is_dir():
+        return entries, sources
+    for child in sorted(cache_dir.iterdir()):
+        if child.name.endswith(PAGE_STORE_SUFFIXES) and child.name.startswith('pages'):
+            language = get_language_of_pages_dir(child.name.rsplit('.', 1)[0])
+            if child.name.endswith('.pack'):
+                pack = open_page_pack(language, system_cache)
+            else:
+                pack = open_page_archive(language, system_cache)
+            if pack is None:
+                continue
+            sources[child.name] = get_source_signature(child)
+            mtime = child.stat().st_mtime
+            entries += [(command, platform, language, size, mtime)
+                        for platform, command, size, _ in pack.entries()]
+        elif child.name.startswith('pages') and child.is_dir():
+            language = get_language_of_pages_dir(child.name)
+            sources[child.name] = get_source_signature(child)
+            for platform_dir in child.iterdir():
+                if not platform_dir.is_dir():
+                    continue
+                sources[f"{child.name}/{platform_dir.name}"] = get_source_signature(platform_dir)
+                with os.scandir(platform_dir) as files:
+                    for file in files:
+                        if not file.name.endswith('.md'):
+                            continue
+                        stat = file.stat()
+                        entries.append((
+                            file.name[:-len('.md')],
+                            platform_dir.name,
+                            language,
+                            stat.st_size,
+                            stat.st_mtime
+                        ))
+    # A page stored as a file takes precedence over the same page in a pack
+    unique = {}
+    for entry in entries:
+        key = entry[:3]
+        if key not in unique or entry[4] > unique[key][4]:
+            unique[key] = entry
+    return sorted(unique.values()), sources
+
+
+def write_command_index(
+    entries: List[CommandEntry],
+    sources: Dict[str, str],
+    system_cache: bool = False
+) -> None:
+    platforms = sorted({entry[1] for entry in entries})
+    languages = sorted({entry[2] for entry in entries})
+    platform_ids = {platform: i for i, platform in enumerate(platforms)}
+    language_ids = {language: i for i, language in enumerate(languages)}
+    meta = '\n'.join(
+        ['\t'.join(platforms), '\t'.join(languages)] +
+        [f"{source}\t{signature}" for source, signature in sources.items()]
+    ).encode('utf-8')
+    records = bytearray()
+    names = bytearray()
+    for command, platform, language, size, mtime in entries:
+        name = command.encode('utf-8')
+        records += COMMAND_INDEX_RECORD.pack(
+            len(names), len(name), platform_ids[platform], language_ids[language], size, mtime
+        )
+        names += name
+    path = get_command_index_path(system_cache)
+    with AtomicFile(path, sync=True) as index_file:
+        index_file.write(COMMAND_INDEX_HEADER.pack(
+            COMMAND_INDEX_MAGIC, COMMAND_INDEX_VERSION, len(meta), len(entries)
+        ))
+        index_file.write(meta)
+        index_file.write(records)
+        index_file.write(names)
+
+
+def build_command_index(system_cache: bool = False) -> List[CommandEntry]:
+    """Scan the cache and store the result as the command index."""
+    entries, sources = scan_command_entries(system_cache)
+    try:
+        write_command_index(entries, sources, system_cache)
+    except OSError:
+        pass
+    return entries
+
+
+_COMMAND_INDEXES = {}
+
+
+def open_command_index(
+    languages: Optional[List[str]] = None,
+    system_cache: bool = False
+) -> Optional[CommandIndex]:
+    """Return the command index, or None if it is missing or stale for the languages."""
+    index = load_command_index(system_cache)
+    if index is None or index.is_stale(languages):
+        return None
+    return index
+
+
+def load_command_index(system_cache: bool = False) -> Optional[CommandIndex]:
+    """Return the command index, stale or not, reusing the mapping while the file is unchanged."""
+    path = get_command_index_path(system_cache)
+    signature = get_source_signature(path)
+    if signature == '-':
+        return None
+    cached = _COMMAND_INDEXES.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    try:
+        index = CommandIndex(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    _COMMAND_INDEXES[path] = (signature, index)
+    return index
+
+
+def get_changed_pages_dirs(
+    cache_dir: Path,
+    sources: Dict[str, str],
+    platforms: List[str],
+    languages: List[str]
+) -> Set[Tuple[str, str]]:
+    """Return the (platform, language) pairs whose directory or pack changed
+    since their signatures were recorded."""
+    changed = set()
+    for language in languages:
+        pages_dir = get_pages_dir(language)
+        if any(
+            get_source_signature(cache_dir / source) != sources.get(source, '-')
+            for source in (pages_dir, *(pages_dir + suffix for suffix in PAGE_STORE_SUFFIXES))
+        ):
+            changed.update((platform, language) for platform in platforms)
+            continue
+        for platform in platforms:
+            source = f"{pages_dir}/{platform}"
+            if get_source_signature(cache_dir / source) != sources.get(source, '-'):
+                changed.add((platform, language))
+    return changed
+
+
+def find_cached_pages(
+    command: str,
+    platforms: List[str],
+    languages: List[str],
+    system_cache: bool = False
+) -> Optional[Set[Tuple[str, str]]]:
+    """Return the (platform, language) pairs that may have a cached page of
+    the command, or None if there is no command index to tell, in which case
+    every pair has to be checked.
+
+    The pairs are the pages of the command in the index, along with the
+    directories and packs that changed since the index was built, such as
+    the platform directory a page was just downloaded to. So the index
+    stays useful until the next update, without being rebuilt: a lookup
+    never scans the cache, which only updates and downloads do.
+    """
+    with trace('command index') as span:
+        cache_dir = get_system_cache_dir() if system_cache else get_cache_dir()
+        index = load_command_index(system_cache)
+        if index is None and not cache_dir.is_dir():
+            # Nothing is cached at all
+            span.set(outcome='miss')
+            return set()
+        if index is None:
+            span.set(outcome='miss')
+            return None
+        changed = get_changed_pages_dirs(
+            cache_dir, index.sources, [platform for platform in platforms if platform is not None], languages
+        )
+        span.set(outcome='stale' if changed else 'hit')
+        return changed | {(platform, language) for platform, language, _, _ in index.find(command)}
+
+
+SEARCH_INDEX_MAGIC = b'TLDRSIDX'
+SEARCH_INDEX_VERSION = 2
+# magic, version, length of the metadata, number of documents, number of
+# terms, length of the name table
+SEARCH_INDEX_HEADER = struct.Struct('<8sIIIII')
+# name offset, name length, description offset, description length, platform id, language id
+SEARCH_DOCUMENT_RECORD = struct.Struct('<IHIHBB')
+# term offset, term length, first posting, number of postings, inverse document frequency
+SEARCH_TERM_RECORD = struct.Struct('<IHIIf')
+# document id, BM25 weight of the term in the document
+SEARCH_POSTING = struct.Struct('<If')
+SEARCH_TERM_REGEX = re.compile(r'[^\W_]{2,}')
+# Query words this long also match the words they are a prefix of
+SEARCH_PREFIX_LENGTH = 3
+# Words of the command name count this many times
+SEARCH_TITLE_WEIGHT = 3
+SEARCH_RESULTS = 20
+# The search index is only rebuilt when these change: the update stamps,
+# packs and kept archives. Pages downloaded one by one are searched once the
+# next update rebuilds it, so a lookup never makes the next search read
+# every page again.
+SEARCH_SOURCE_SUFFIXES = ('.updated',) + PAGE_STORE_SUFFIXES
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SearchResult = Tuple[str, str, str, str, float]
+
+
+def get_search_index_path(system_cache: bool = False) -> Path:
+    cache_dir = get_system_cache_dir() if system_cache else get_cache_dir()
+    return cache_dir / 'search.idx'
+
+
+def get_search_terms(text: str) -> List[str]:
+    return SEARCH_TERM_REGEX.findall(text.lower())
+
+
+def get_page_terms(command: str, page: 'Page') -> Dict[str, int]:
+    """Count the words of the command name, description, example
+    descriptions and example commands of a page."""
+    texts = [command] * SEARCH_TITLE_WEIGHT
+    for kind, value in page.lines:
+        if kind == 'description':
+            texts.append(value)
+        elif kind == 'example':
+            texts += [text for text, _ in value]
+        elif kind == 'command':
+            texts += [f"{token.text} {token.short} {token.long}" for token in value]
+    counts = {}
+    for term in get_search_terms(' '.join(texts)):
+        counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+class SearchIndex:
+    """Memory mapped inverted index over the contents of every page in the cache.
+
+    Terms are sorted, so a query word is found with a binary search, and
+    each posting holds the BM25 weight of the term in the page, so ranking
+    only sums the weights of the postings of the query words. The lowercase
+    command names of the pages, one per line, are searched for the query as
+    a whole, and only the pages whose name matches are read.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._cache_dir = path.parent
+        with path.open('rb') as index_file:
+            self._map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_length, self._count, self._term_count, names_length = \
+            SEARCH_INDEX_HEADER.unpack_from(self._map)
+        if magic != SEARCH_INDEX_MAGIC or version != SEARCH_INDEX_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a tldr search index")
+        start = SEARCH_INDEX_HEADER.size
+        platforms, languages, *sources = \
+            self._map[start:start + meta_length].decode('utf-8').split('\n')
+        self.platforms = platforms.split('\t') if platforms else []
+        self.languages = languages.split('\t') if languages else []
+        self.sources = dict(source.split('\t') for source in sources)
+        self._documents = start + meta_length
+        self._terms = self._documents + self._count * SEARCH_DOCUMENT_RECORD.size
+        self._postings = self._terms + self._term_count * SEARCH_TERM_RECORD.size
+        last = self._term_record(self._term_count - 1) if self._term_count else (0, 0, 0, 0)
+        self._names = self._postings + (last[2] + last[3]) * SEARCH_POSTING.size
+        self._strings = self._names + names_length
+
+    def __len__(self) -> int:
+        return self._count
+
+    def is_stale(self, languages: Optional[List[str]] = None) -> bool:
+        return are_sources_stale(self._cache_dir, self.sources, languages, SEARCH_SOURCE_SUFFIXES)
+
+    def _string(self, offset: int, length: int) -> bytes:
+        return self._map[self._strings + offset:self._strings + offset + length]
+
+    def _term_record(self, index: int) -> Tuple[int, int, int, int, float]:
+        return SEARCH_TERM_RECORD.unpack_from(self._map, self._terms + index * SEARCH_TERM_RECORD.size)
+
+    def _term(self, index: int) -> bytes:
+        return self._string(*self._term_record(index)[:2])
+
+    def _bisect(self, term: bytes) -> int:
+        low, high = 0, self._term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def document(self, document_id: int) -> Tuple[str, str, str, str]:
+        """Return the command, platform, language and description of a page."""
+        name_offset, name_length, description_offset, description_length, platform, language = \
+            SEARCH_DOCUMENT_RECORD.unpack_from(
+                self._map,
+                self._documents + document_id * SEARCH_DOCUMENT_RECORD.size
+            )
+        return (
+            self._string(name_offset, name_length).decode('utf-8'),
+            self.platforms[platform],
+            self.languages[language],
+            self._string(description_offset, description_length).decode('utf-8')
+        )
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """Return the BM25 score of every page matching a word of the query."""
+        scores = {}
+        for word in set(get_search_terms(query)):
+            key = word.encode('utf-8')
+            # A word matching several terms of a page counts once, with its best weight
+            word_scores = {}
+            index = self._bisect(key)
+            while index < self._term_count:
+                term_offset, term_length, first, count, idf = self._term_record(index)
+                term = self._string(term_offset, term_length)
+                if term != key and not (len(key) >= SEARCH_PREFIX_LENGTH and term.startswith(key)):
+                    break
+                start = self._postings + first * SEARCH_POSTING.size
+                for document_id, weight in SEARCH_POSTING.iter_unpack(
+                    self._map[start:start + count * SEARCH_POSTING.size]
+                ):
+                    if word_scores.get(document_id, 0) < idf * weight:
+                        word_scores[document_id] = idf * weight
+                index += 1
+            for document_id, score in word_scores.items():
+                scores[document_id] = scores.get(document_id, 0) + score
+        return scores
+
+    def name_matches(self, query: str, platforms: List[str], languages: List[str]) -> List[SearchResult]:
+        """Return the pages of the platforms and languages whose command name
+        contains the query, with one page per command and a score of 0."""
+        names = self._map[self._names:self._strings]
+        query = query.lower().encode('utf-8')
+        results = []
+        seen = set()
+        document_id = 0
+        counted = 0
+        position = names.find(query)
+        while position != -1 and position < len(names):
+            # The line of the match is the id of the document
+            document_id += names.count(b'\n', counted, position)
+            command, platform, language, description = self.document(document_id)
+            if platform in platforms and language in languages and command not in seen:
+                seen.add(command)
+                results.append((command, platform, language, description, 0.0))
+            counted = names.index(b'\n', position) + 1
+            document_id += 1
+            position = names.find(query, counted)
+        return results
+
+    def search(
+        self,
+        query: str,
+        platforms: List[str],
+        languages: List[str],
+        limit: Optional[int] = SEARCH_RESULTS
+    ) -> List[SearchResult]:
+        """Return the best matching pages of the platforms and languages, best
+        first, as (command, platform, language, description, score) tuples,
+        with one page per command, and at most ``limit`` of them."""
+        results = []
+        seen = set()
+        for document_id, score in sorted(self.scores(query).items(), key=lambda item: -item[1]):
+            command, platform, language, description = self.document(document_id)
+            if platform not in platforms or language not in languages or command in seen:
+                continue
+            seen.add(command)
+            results.append((command, platform, language, description, score))
+            if len(results) == limit:
+                break
+        return results
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def write_search_index(
+    documents: List[Tuple[str, str, str, str]],
+    terms: List[Dict[str, int]],
+    sources: Dict[str, str],
+    system_cache: bool = False
+) -> None:
+    """Store the (command, platform, language, description) of every page
+    with the number of times each term appears in it."""
+    platforms = sorted({document[1] for document in documents})
+    languages = sorted({document[2] for document in documents})
+    platform_ids = {platform: i for i, platform in enumerate(platforms)}
+    language_ids = {language: i for i, language in enumerate(languages)}
+    meta = '\n'.join(
+        ['\t'.join(platforms), '\t'.join(languages)] +
+        [f"{source}\t{signature}" for source, signature in sources.items()]
+    ).encode('utf-8')
+
+    strings = bytearray()
+
+    def add_string(text: str) -> Tuple[int, int]:
+        data = text.encode('utf-8')
+        strings.extend(data)
+        return len(strings) - len(data), len(data)
+
+    records = bytearray()
+    for command, platform, language, description in documents:
+        records += SEARCH_DOCUMENT_RECORD.pack(
+            *add_string(command),
+            # The length is stored in two bytes, enough for any description
+            *add_string(description[:0xffff // 4]),
+            platform_ids[platform],
+            language_ids[language]
+        )
+
+    lengths = [sum(counts.values()) for counts in terms]
+    average_length = sum(lengths) / len(lengths) if lengths else 1
+    postings = {}
+    for document_id, counts in enumerate(terms):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[document_id] / average_length)
+        for term, count in counts.items():
+            postings.setdefault(term.encode('utf-8'), []).append(
+                (document_id, count * (BM25_K1 + 1) / (count + norm))
+            )
+    names = ''.join(f"{document[0].lower()}\n" for document in documents).encode('utf-8')
+    term_records = bytearray()
+    posting_records = bytearray()
+    first = 0
+    for term in sorted(postings):
+        term_postings = postings[term]
+        idf = math.log(1 + (len(documents) - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+        strings.extend(term)
+        term_records += SEARCH_TERM_RECORD.pack(len(strings) - len(term), len(term), first, len(term_postings), idf)
+        for posting in term_postings:
+            posting_records += SEARCH_POSTING.pack(*posting)
+        first += len(term_postings)
+
+    path = get_search_index_path(system_cache)
+    with AtomicFile(path, sync=True) as index_file:
+        index_file.write(SEARCH_INDEX_HEADER.pack(
+            SEARCH_INDEX_MAGIC, SEARCH_INDEX_VERSION, len(meta), len(documents), len(postings), len(names)
+        ))
+        index_file.write(meta)
+        index_file.write(records)
+        index_file.write(term_records)
+        index_file.write(posting_records)
+        index_file.write(names)
+        index_file.write(strings)
+
+
+def build_search_index(system_cache: bool = False) -> None:
+    """Read every page in the cache and store the search index of their
+    contents."""
+    entries, sources = scan_command_entries(system_cache)
+    documents = []
+    terms = []
+    for command, platform, language, _, _ in entries:
+        page = load_page_from_cache(command, platform, language, system_cache)
+        if page is None:
+            continue
+        lines = page.splitlines()
+        try:
+            parsed = parse_page(lines)
+        except UnicodeDecodeError:
+            continue
+        description = parsed.description[0].strip() if parsed.description else ''
+        documents.append((command, platform, language, description))
+        terms.append(get_page_terms(command, parsed))
+    cache_dir = get_system_cache_dir() if system_cache else get_cache_dir()
+    sources = {source: signature for source, signature in sources.items() if source.endswith(PAGE_STORE_SUFFIXES)}
+    for language in {entry[2] for entry in entries}:
+        stamp = f"{get_pages_dir(language)}.updated"
+        sources[stamp] = get_source_signature(cache_dir / stamp)
+    try:
+        write_search_index(documents, terms, sources, system_cache)
+    except OSError:
+        pass
+
+
+_SEARCH_INDEXES = {}
+
+
+def open_search_index(
+    languages: Optional[List[str]] = None,
+    system_cache: bool = False
+) -> Optional[SearchIndex]:
+    """Return the search index, or None if it is missing or stale for the languages."""
+    path = get_search_index_path(system_cache)
+    signature = get_source_signature(path)
+    if signature == '-':
+        return None
+    cached = _SEARCH_INDEXES.get(path)
+    if cached is not None and cached[0] == signature:
+        index = cached[1]
+    else:
+        try:
+            index = SearchIndex(path)
+        except (OSError, ValueError, struct.error):
+            return None
+        _SEARCH_INDEXES[path] = (signature, index)
+    if index.is_stale(languages):
+        return None
+    return index
+
+
+SUGGESTION_INDEX_MAGIC = b'TLDRSUGG'
+SUGGESTION_INDEX_VERSION = 1
+# magic, version, number of names, number of keys
+SUGGESTION_INDEX_HEADER = struct.Struct('<8sIII')
+# name offset, name length
+SUGGESTION_NAME_RECORD = struct.Struct('<IH')
+# key offset, key length, first name id, number of name ids
+SUGGESTION_KEY_RECORD = struct.Struct('<IHII')
+SUGGESTION_NAME_ID = struct.Struct('<I')
+SUGGESTIONS = 3
+
+
+def get_suggestion_index_path(system_cache: bool = False) -> Path:
+    cache_dir = get_system_cache_dir() if system_cache else get_cache_dir()
+    return cache_dir / 'suggestions.idx'
+
+
+def get_deletions(word: str) -> List[str]:
+    """Return the word and every word made by deleting one of its characters.
+
+    Two words within one insertion, deletion, substitution or transposition
+    of each other always have one of these in common.
+    """
+    return [word] + [word[:i] + word[i + 1:] for i in range(len(word))]
+
+
+def get_edit_distance(source: str, target: str) -> int:
+    """Return the optimal string alignment distance of two words, which
+    counts swapping two adjacent characters as one edit."""
+    rows = [list(range(len(target) + 1))]
+    for i in range(1, len(source) + 1):
+        row = [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = source[i - 1] != target[j - 1]
+            row[j] = min(row[j - 1] + 1, rows[-1][j] + 1, rows[-1][j - 1] + cost)
+            if i > 1 and j > 1 and source[i - 1] == target[j - 2] and source[i - 2] == target[j - 1]:
+                row[j] = min(row[j], rows[-2][j - 2] + 1)
+        rows.append(row)
+    return rows[-1][-1]
+
+
+class SuggestionIndex:
+    """Memory mapped index of every command name in the cache by the names
+    made by deleting one of its characters.
+
+    Looking up the deletions of a misspelled command finds the names within
+    about one edit of it with a binary search each, and only those names are
+    compared with the command.
+    """
+
+    def __init__(self, path: Path) -> None:
+        with path.open('rb') as index_file:
+            self._map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, self._key_count = SUGGESTION_INDEX_HEADER.unpack_from(self._map)
+        if magic != SUGGESTION_INDEX_MAGIC or version != SUGGESTION_INDEX_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a tldr suggestion index")
+        self._names = SUGGESTION_INDEX_HEADER.size
+        self._keys = self._names + self._count * SUGGESTION_NAME_RECORD.size
+        self._ids = self._keys + self._key_count * SUGGESTION_KEY_RECORD.size
+        last = self._key_record(self._key_count - 1) if self._key_count else (0, 0, 0, 0)
+        self._strings = self._ids + (last[2] + last[3]) * SUGGESTION_NAME_ID.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _string(self, offset: int, length: int) -> bytes:
+        return self._map[self._strings + offset:self._strings + offset + length]
+
+    def _key_record(self, index: int) -> Tuple[int, int, int, int]:
+        return SUGGESTION_KEY_RECORD.unpack_from(self._map, self._keys + index * SUGGESTION_KEY_RECORD.size)
+
+    def _bisect(self, key: bytes) -> int:
+        low, high = 0, self._key_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._string(*self._key_record(middle)[:2]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def name(self, name_id: int) -> str:
+        return self._string(*SUGGESTION_NAME_RECORD.unpack_from(
+            self._map, self._names + name_id * SUGGESTION_NAME_RECORD.size
+        )).decode('utf-8')
+
+    def suggest(self, command: str, limit: int = SUGGESTIONS) -> List[str]:
+        """Return the names closest to the command, closest first."""
+        name_ids = set()
+        for deletion in get_deletions(command):
+            key = deletion.encode('utf-8')
+            index = self._bisect(key)
+            if index == self._key_count:
+                continue
+            key_offset, key_length, first, count = self._key_record(index)
+            if self._string(key_offset, key_length) != key:
+                continue
+            start = self._ids + first * SUGGESTION_NAME_ID.size
+            name_ids.update(
+                name_id for name_id, in
+                SUGGESTION_NAME_ID.iter_unpack(self._map[start:start + count * SUGGESTION_NAME_ID.size])
+            )
+        max_distance = max(1, min(2, len(command) // 3))
+        suggestions = []
+        for name in map(self.name, name_ids):
+            distance = get_edit_distance(command, name)
+            if 0 < distance <= max_distance:
+                suggestions.append((distance, name))
+        return [name for _, name in sorted(suggestions)[:limit]]
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def write_suggestion_index(names: List[str], system_cache: bool = False) -> None:
+    keys = {}
+    for name_id, name in enumerate(names):
+        for deletion in set(get_deletions(name)):
+            keys.setdefault(deletion.encode('utf-8'), []).append(name_id)
+    strings = bytearray()
+    name_records = bytearray()
+    for name in names:
+        data = name.encode('utf-8')
+        name_records += SUGGESTION_NAME_RECORD.pack(len(strings), len(data))
+        strings += data
+    key_records = bytearray()
+    name_ids = bytearray()
+    first = 0
+    for key in sorted(keys):
+        key_records += SUGGESTION_KEY_RECORD.pack(len(strings), len(key), first, len(keys[key]))
+        strings += key
+        for name_id in keys[key]:
+            name_ids += SUGGESTION_NAME_ID.pack(name_id)
+        first += len(keys[key])
+    path = get_suggestion_index_path(system_cache)
+    with AtomicFile(path, sync=True) as index_file:
+        index_file.write(SUGGESTION_INDEX_HEADER.pack(
+            SUGGESTION_INDEX_MAGIC, SUGGESTION_INDEX_VERSION, len(names), len(keys)
+        ))
+        index_file.write(name_records)
+        index_file.write(key_records)
+        index_file.write(name_ids)
+        index_file.write(strings)
+
+
+def build_suggestion_index(entries: Optional[List[CommandEntry]] = None, system_cache: bool = False) -> None:
+    """Store the suggestion index of the command names in the cache."""
+    if entries is None:
+        entries, _ = scan_command_entries(system_cache)
+    try:
+        write_suggestion_index(sorted({entry[0] for entry in entries}), system_cache)
+    except OSError:
+        pass
+
+
+_SUGGESTION_INDEXES = {}
+
+
+def open_suggestion_index(system_cache: bool = False) -> Optional[SuggestionIndex]:
+    path = get_suggestion_index_path(system_cache)
+    signature = get_source_signature(path)
+    if signature == '-':
+        return None
+    cached = _SUGGESTION_INDEXES.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    try:
+        index = SuggestionIndex(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    _SUGGESTION_INDEXES[path] = (signature, index)
+    return index
+
+
+def get_suggestions(command: str) -> List[str]:
+    """Return the cached commands whose name is closest to a misspelled one.
+
+    The index is built by update_cache, or here on first use, and is not
+    checked against the cache, as names added since are rarely misspelled.
+    The names of the system cache are suggested too.
+    """
+    suggestions = set()
+    if get_cache_dir().exists():
+        index = open_suggestion_index()
+        if index is None:
+            build_suggestion_index()
+            index = open_suggestion_index()
+        if index is not None:
+            suggestions.update(index.suggest(command))
+    index = open_suggestion_index(system_cache=True)
+    if index is not None:
+        suggestions.update(index.suggest(command))
+    return sorted(suggestions, key=lambda name: (get_edit_distance(command, name), name))[:SUGGESTIONS]
+
+
 def load_page_from_cache(command: str, platform: str, language: str, system_cache: bool = False) -> Optional[str]:
     try:
         with get_cache_file_path(
@@ -126,31 +1604,435 @@ def load_page_from_cache(command: str, platform: str, language: str, system_cach
         return cache_file_contents
     except Exception:
         pass
+    # Pages fetched one by one are stored as files and take precedence over the pack
+    for _, store in open_page_stores(language, system_cache):
+        page = store.get(platform, command)
+        if page is not None:
+            return page
+    return None
+
+
+def store_page_to_cache(
+    page: str,
+    command: str,
+    platform: str,
+    language: str
+) -> Optional[str]:
+    """Store a downloaded page. The command index is built along with the
+    first page, as lookups don't build it and pages may only ever be
+    downloaded one by one."""
+    try:
+        cache_file_path = get_cache_file_path(command, platform, language)
+        cache_file_path.parent.mkdir(parents=True, exist_ok=True)
+        with AtomicFile(cache_file_path) as cache_file:
+            cache_file.write(page)
+        if not get_command_index_path().exists():
+            build_command_index()
+    except Exception:
+        pass
+
+
+def copy_page_to_cache(
+    source: BinaryIO,
+    command: str,
+    platform: str,
+    language: str
+) -> None:
+    cache_file_path = get_cache_file_path(command, platform, language)
+    import shutil
+    cache_file_path.parent.mkdir(parents=True, exist_ok=True)
+    with AtomicFile(cache_file_path) as cache_file:
+        shutil.copyfileobj(source, cache_file, DOWNLOAD_CHUNK_SIZE)
+
+
+def get_update_stamp_path(language: str) -> Path:
+    return get_cache_dir() / f"{get_pages_dir(language)}.updated"
+
+
+def get_cache_state(command: str, platform: str, language: str) -> str:
+    """Return 'hit' if the page is in the cache and recent enough, 'stale' if
+    it is in the cache but too old, and 'miss' otherwise."""
+    with trace('cache stat', platform=platform, language=language) as span:
+        try:
+            cache_file_path = get_cache_file_path(command, platform, language)
+            if not cache_file_path.is_file():
+                for store_path, store in open_page_stores(language):
+                    if store.get(platform, command) is not None:
+                        cache_file_path = store_path
+                        break
+            last_modified = cache_file_path.stat().st_mtime
+            # The archive of the language was last found unchanged at the stamp's mtime
+            try:
+                last_modified = max(last_modified, get_update_stamp_path(language).stat().st_mtime)
+            except OSError:
+                pass
+            hours_passed = (time.time() - last_modified) / 3600
+            state = 'hit' if hours_passed <= MAX_CACHE_AGE else 'stale'
+        except Exception:
+            state = 'miss'
+        span.set(outcome=state)
+        return state
+
+
+def have_recent_cache(command: str, platform: str, language: str) -> bool:
+    return get_cache_state(command, platform, language) == 'hit'
+
+
+def touch_page_in_cache(page: bytes, command: str, platform: str, language: str) -> None:
+    """Mark a cached page as fresh without rewriting it."""
+    cache_file_path = get_cache_file_path(command, platform, language)
+    try:
+        os.utime(cache_file_path)
+    except OSError:
+        # The page only exists in the pack, which is shared by every page
+        store_page_to_cache(page, command, platform, language)
+
+
+VALIDATORS_LOCK = threading.Lock()
+
+
+def get_validators_path() -> Path:
+    return get_cache_dir() / 'validators.json'
+
+
+def load_validators() -> Dict[str, Dict[str, str]]:
+    import json
+    try:
+        with get_validators_path().open(encoding='utf-8') as validators_file:
+            return json.load(validators_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def store_validators(url: str, headers) -> None:
+    """Remember the ETag and Last-Modified of a response for conditional requests."""
+    if not url.startswith(('http://', 'https://')):
+        return
+    import json
+    validators = {}
+    if headers.get('ETag'):
+        validators['etag'] = headers['ETag']
+    if headers.get('Last-Modified'):
+        validators['last_modified'] = headers['Last-Modified']
+    with VALIDATORS_LOCK:
+        stored = load_validators()
+        if stored.get(url) == (validators or None):
+            return
+        if validators:
+            stored[url] = validators
+        else:
+            del stored[url]
+        path = get_validators_path()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with AtomicFile(path, 'w', encoding='utf-8') as validators_file:
+                json.dump(stored, validators_file)
+        except OSError:
+            pass
+
+
+def get_request(url: str, conditional: bool = False) -> 'Request':
+    """Build a request for the url, conditional on the stored validators if asked to."""
+    from urllib.request import Request
+    headers = dict(REQUEST_HEADERS)
+    if conditional:
+        validators = load_validators().get(url, {})
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'last_modified' in validators:
+            headers['If-Modified-Since'] = validators['last_modified']
+    return Request(url, headers=headers)
+
+
+class PooledResponse:
+    """Response of a pooled connection, which goes back to the pool once the
+    body has been read and the response is closed."""
+
+    def __init__(self, pool: 'ConnectionPool', key: Tuple[str, str, int], connection, response) -> None:
+        self._pool = pool
+        self._key = key
+        self._connection = connection
+        self._response = response
+        self.status = response.status
+        self.headers = response.headers
+
+    def __enter__(self) -> 'PooledResponse':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def getcode(self) -> int:
+        return self.status
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        return self._response.read(amt)
+
+    def close(self) -> None:
+        if self._connection is None:
+            return
+        if self._response.isclosed() and not self._response.will_close:
+            self._pool.release(self._key, self._connection)
+        else:
+            self._response.close()
+            self._connection.close()
+        self._connection = None
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections shared by every download, by host.
+
+    Requests that need a proxy, or that are not HTTP(S), go through urlopen.
+    """
+
+    MAX_REDIRECTS = 10
+    REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+    def __init__(self, maxsize: int = NETWORK_JOBS) -> None:
+        self.maxsize = maxsize
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._ssl_context = None
+
+    def _connect(self, key: Tuple[str, str, int], timeout):
+        import http.client
+        scheme, host, port = key
+        if scheme == 'http':
+            return http.client.HTTPConnection(host, port, timeout=timeout)
+        if self._ssl_context is None:
+            import ssl
+            self._ssl_context = get_urlopen_context() or ssl.create_default_context()
+        return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context)
+
+    def acquire(self, key: Tuple[str, str, int], timeout) -> Tuple[object, bool]:
+        import socket
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                connection = idle.pop()
+                if connection.sock is not None:
+                    connection.sock.settimeout(
+                        socket.getdefaulttimeout() if timeout is socket._GLOBAL_DEFAULT_TIMEOUT else timeout
+                    )
+                return connection, True
+        return self._connect(key, timeout), False
+
+    def release(self, key: Tuple[str, str, int], connection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    @staticmethod
+    def is_direct(request: 'Request') -> bool:
+        """Tell whether the request is sent over a connection of the pool, and
+        not through urlopen."""
+        from urllib.request import getproxies, proxy_bypass
+        parts = urlsplit(request.full_url)
+        return parts.scheme in ('http', 'https') and not request.has_proxy() and \
+            not (parts.scheme in getproxies() and not proxy_bypass(parts.hostname))
+
+    @staticmethod
+    def get_route(url: str) -> Tuple[Tuple[str, str, int], str]:
+        """Return the scheme, host and port to connect to for the url, and the
+        path to request."""
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        return (parts.scheme, parts.hostname, port), path
+
+    @classmethod
+    def get_redirect(cls, url: str, status: int, headers) -> Optional[str]:
+        """Return the url a response redirects to, or None if it does not."""
+        if status in cls.REDIRECT_CODES and headers.get('Location'):
+            return urljoin(url, headers['Location'])
+        return None
+
+    @classmethod
+    def redirects(cls, request: 'Request') -> Iterator[int]:
+        """Count the requests sent for a request and its redirects, and raise
+        URLError past MAX_REDIRECTS of them."""
+        from urllib.error import URLError
+        yield from range(cls.MAX_REDIRECTS)
+        raise URLError(f"too many redirects for {request.full_url}")
+
+    def open(self, request: 'Request', timeout: Optional[float] = None):
+        """Send a GET request, following redirects, and behave like urlopen:
+        responses other than 2xx raise HTTPError and failures raise URLError."""
+        import http.client
+        import socket
+        from urllib.error import HTTPError, URLError
+        from urllib.request import urlopen
+        if timeout is None:
+            timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+        if not self.is_direct(request):
+            return urlopen(request, timeout=timeout, context=get_urlopen_context())
+        url = request.full_url
+        headers = dict(request.header_items())
+        for _ in self.redirects(request):
+            key, path = self.get_route(url)
+            while True:
+                connection, reused = self.acquire(key, timeout)
+                try:
+                    connection.request('GET', path, headers=headers)
+                    response = connection.getresponse()
+                    break
+                except (OSError, http.client.HTTPException) as err:
+                    connection.close()
+                    # The server may have dropped a connection that sat idle
+                    if reused and isinstance(err, (http.client.RemoteDisconnected, ConnectionError)):
+                        continue
+                    raise URLError(err)
+            result = PooledResponse(self, key, connection, response)
+            redirect = self.get_redirect(url, response.status, response.headers)
+            if redirect is not None:
+                with result:
+                    result.read()
+                url = redirect
+                continue
+            if not 200 <= response.status < 300:
+                with result:
+                    body = result.read()
+                raise HTTPError(url, response.status, response.reason, response.headers, BytesIO(body))
+            return result
+
+
+HTTP_POOL = ConnectionPool()
+
+
+def open_url(request: 'Request', timeout: Optional[float] = None):
+    return HTTP_POOL.open(request, timeout=timeout)
+
+
+async def read_response_body(reader, status: int, headers, write) -> None:
+    """Pass the body of an HTTP/1.1 response to ``write`` as it arrives.
+
+    As in http.client, 1xx, 204 and 304 responses have no body, whatever
+    their headers say.
+    """
+    if status < 200 or status in (204, 304):
+        return
+    if headers.get('Transfer-Encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                break
+            while size > 0:
+                chunk = await reader.readexactly(min(size, DOWNLOAD_CHUNK_SIZE))
+                size -= len(chunk)
+                await write(chunk)
+            await reader.readline()
+    elif headers.get('Content-Length') is not None:
+        remaining = int(headers['Content-Length'])
+        while remaining > 0:
+            chunk = await reader.readexactly(min(remaining, DOWNLOAD_CHUNK_SIZE))
+            remaining -= len(chunk)
+            await write(chunk)
+    else:
+        while chunk := await reader.read(DOWNLOAD_CHUNK_SIZE):
+            await write(chunk)
+
+
+async def open_url_async(
+    request: 'Request',
+    timeout: Optional[float] = None,
+    sink: Optional[BinaryIO] = None
+) -> Tuple[int, Any, bytes]:
+    """Send a GET request without blocking the event loop, following redirects,
+    and return the status, headers and body of the response.
+
+    Like open_url, responses other than 2xx raise HTTPError and failures raise
+    URLError. With a ``sink``, the body is written to it from a thread as it
+    arrives instead of being returned. Requests that open_url would not send
+    over its own connections are sent by open_url in a thread.
+    """
+    import asyncio
+    import http.client
+    from urllib.error import HTTPError, URLError
 
+    if not ConnectionPool.is_direct(request):
+        def fetch() -> Tuple[int, Any, bytes]:
+            with open_url(request, timeout=timeout) as response:
+                if sink is None:
+                    return response.getcode(), response.headers, response.read()
+                while chunk := response.read(DOWNLOAD_CHUNK_SIZE):
+                    sink.write(chunk)
+                return response.getcode(), response.headers, b''
+        return await asyncio.to_thread(fetch)
 
-def store_page_to_cache(
-    page: str,
-    command: str,
-    platform: str,
-    language: str
-) -> Optional[str]:
-    try:
-        cache_file_path = get_cache_file_path(command, platform, language)
-        cache_file_path.parent.mkdir(parents=True, exist_ok=True)
-        with cache_file_path.open("wb") as cache_file:
-            cache_file.write(page)
-    except Exception:
-        pass
+    async def get(url: str, request_headers: Dict[str, str]) -> Tuple[int, str, Any, bytes]:
+        parts = urlsplit(url)
+        (scheme, hostname, port), path = ConnectionPool.get_route(url)
+        ssl_context = None
+        if scheme == 'https':
+            import ssl
+            ssl_context = get_urlopen_context() or ssl.create_default_context()
+        reader, writer = await asyncio.open_connection(hostname, port, ssl=ssl_context)
+        try:
+            host = hostname + (f":{parts.port}" if parts.port else '')
+            lines = [f"GET {path} HTTP/1.1", f"Host: {host}", "Connection: close"]
+            lines += [f"{name}: {value}" for name, value in request_headers.items()]
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+            await writer.drain()
+            while True:
+                status_line = (await reader.readline()).decode('latin-1').rstrip('\r\n').split(' ', 2)
+                header_lines = []
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    header_lines.append(line)
+                headers = http.client.parse_headers(BytesIO(b''.join(header_lines) + b'\r\n'))
+                status = int(status_line[1])
+                # Interim responses, such as 100 Continue, precede the final one
+                if status >= 200:
+                    break
+            body = []
 
+            async def write(chunk: bytes) -> None:
+                if sink is not None and 200 <= status < 300:
+                    await asyncio.to_thread(sink.write, chunk)
+                else:
+                    body.append(chunk)
+
+            await read_response_body(reader, status, headers, write)
+            return status, status_line[2] if len(status_line) > 2 else '', headers, b''.join(body)
+        finally:
+            writer.close()
+
+    async def follow() -> Tuple[int, Any, bytes]:
+        url = request.full_url
+        request_headers = dict(request.header_items())
+        for _ in ConnectionPool.redirects(request):
+            try:
+                status, reason, headers, body = await get(url, request_headers)
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError) as err:
+                raise URLError(err)
+            redirect = ConnectionPool.get_redirect(url, status, headers)
+            if redirect is not None:
+                url = redirect
+                continue
+            if not 200 <= status < 300:
+                raise HTTPError(url, status, reason, headers, BytesIO(body))
+            return status, headers, body
 
-def have_recent_cache(command: str, platform: str, language: str) -> bool:
     try:
-        cache_file_path = get_cache_file_path(command, platform, language)
-        last_modified = datetime.fromtimestamp(cache_file_path.stat().st_mtime)
-        hours_passed = (datetime.now() - last_modified).total_seconds() / 3600
-        return hours_passed <= MAX_CACHE_AGE
-    except Exception:
-        return False
+        return await asyncio.wait_for(follow(), timeout)
+    except asyncio.TimeoutError:
+        raise URLError(f"timed out after {timeout}s")
+
+
+def url_error() -> type:
+    """Return URLError for an except clause, which only evaluates it once
+    something was raised, so urllib is not imported for cache hits."""
+    from urllib.error import URLError
+    return URLError
 
 
 def get_page_url(command: str, platform: str, remote: str, language: str) -> str:
@@ -171,50 +2053,215 @@ def get_page_for_platform(
     remote: str,
     language: str,
     only_use_cache: bool = False,
-    system_cache: bool = False
+    system_cache: bool = False,
+    timeout: float = NETWORK_TIMEOUT
 ) -> str:
-    data_downloaded = False
-    if USE_CACHE and system_cache and get_cache_file_path(command, platform, language, system_cache).is_file():
-        data = load_page_from_cache(command, platform, language, system_cache)
-    elif USE_CACHE and have_recent_cache(command, platform, language):
-        data = load_page_from_cache(command, platform, language)
-    elif only_use_cache:
-        raise CacheNotExist("Cache for {} in {} not Found".format(
-            command,
-            platform,
-        ))
-    else:
-        page_url = get_page_url(command, platform, remote, language)
-        try:
-            data = urlopen(
-                Request(page_url, headers=REQUEST_HEADERS),
-                timeout=10,
-                context=URLOPEN_CONTEXT
-            ).read()
-            data_downloaded = True
-        except Exception:
-            if not USE_CACHE:
-                raise
+    with trace('lookup', platform=platform, language=language) as span:
+        data_downloaded = False
+        data = None
+        state = 'miss'
+        if USE_CACHE and system_cache:
+            data = load_page_from_cache(command, platform, language, system_cache)
+        if data is not None:
+            state = 'system'
+        elif USE_CACHE and (state := get_cache_state(command, platform, language)) == 'hit':
             data = load_page_from_cache(command, platform, language)
-            if data is None:
-                raise
-    if data_downloaded and USE_CACHE:
-        store_page_to_cache(data, command, platform, language)
-    return data.splitlines()
+        elif (
+            state == 'stale' and CACHE_REFRESH == 'background' and
+            (data := load_page_from_cache(command, platform, language)) is not None
+        ):
+            refresh_in_background(command, platform, remote, language)
+        elif only_use_cache:
+            span.set(outcome=state)
+            raise CacheNotExist("Cache for {} in {} not Found".format(
+                command,
+                platform,
+            ))
+        else:
+            from urllib.error import HTTPError
+            span.set(outcome=state)
+            page_url = get_page_url(command, platform, remote, language)
+            cached_data = load_page_from_cache(command, platform, language) if USE_CACHE else None
+            with trace('download', platform=platform, language=language) as download:
+                try:
+                    with open_url(
+                        get_request(page_url, conditional=cached_data is not None),
+                        timeout=timeout
+                    ) as response:
+                        data = response.read()
+                        headers = response.headers
+                    download.set(outcome=response.status, bytes=len(data))
+                    data_downloaded = True
+                except Exception as err:
+                    download.set(outcome=getattr(err, 'code', 'error'))
+                    if not USE_CACHE:
+                        raise
+                    data = cached_data
+                    if data is None:
+                        raise
+                    if isinstance(err, HTTPError) and err.code == 304:
+                        touch_page_in_cache(data, command, platform, language)
+        span.set(outcome=state, bytes=len(data))
+        if data_downloaded and USE_CACHE:
+            store_page_to_cache(data, command, platform, language)
+            store_validators(page_url, headers)
+        return data.splitlines()
 
 
 def update_page_for_platform(
     command: str,
     platform: str,
     remote: str,
-    language: str
+    language: str,
+    timeout: float = NETWORK_TIMEOUT
 ) -> None:
-    page_url = get_page_url(platform, command, remote, language)
-    data = urlopen(
-        Request(page_url, headers=REQUEST_HEADERS),
-        context=URLOPEN_CONTEXT
-    ).read()
+    from urllib.error import HTTPError
+    page_url = get_page_url(command, platform, remote, language)
+    cached_data = load_page_from_cache(command, platform, language)
+    try:
+        with open_url(
+            get_request(page_url, conditional=cached_data is not None),
+            timeout=timeout
+        ) as response:
+            data = response.read()
+            headers = response.headers
+    except HTTPError as err:
+        if err.code != 304:
+            raise
+        touch_page_in_cache(cached_data, command, platform, language)
+        return
     store_page_to_cache(data, command, platform, language)
+    store_validators(page_url, headers)
+
+
+def get_refresh_dir(language: str) -> Path:
+    return get_cache_dir() / 'refresh' / get_pages_dir(language)
+
+
+def get_refresh_marker_path(command: str, platform: str, language: str) -> Path:
+    return get_refresh_dir(language) / platform / command
+
+
+def claim_refresh(command: str, platform: str, language: str) -> bool:
+    """Tell whether to refresh the page, in which case it is marked so that
+    other lookups leave it alone for REFRESH_INTERVAL.
+
+    Only one of the lookups racing for the page claims it: the marker is
+    created exclusively, or touched while holding a lock on it once it is
+    out of date. On systems without ``fcntl``, such as Windows, the marker
+    is touched without the lock.
+    """
+    marker = get_refresh_marker_path(command, platform, language)
+    try:
+        if time.time() - marker.stat().st_mtime < REFRESH_INTERVAL:
+            return False
+    except OSError:
+        pass
+    try:
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            pass
+        with marker.open('a') as marker_file:
+            try:
+                import fcntl
+            except ImportError:
+                pass
+            else:
+                # Fails while another lookup is claiming the page
+                fcntl.flock(marker_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # Another lookup may have claimed the page since the first check
+            if time.time() - os.fstat(marker_file.fileno()).st_mtime < REFRESH_INTERVAL:
+                return False
+            os.utime(marker)
+    except OSError:
+        return False
+    return True
+
+
+# The refresh processes started and not seen to exit yet, which a server
+# reaps on the next refresh
+_REFRESH_PROCESSES = []
+
+
+def refresh_in_background(command: str, platform: str, remote: Optional[str], language: str) -> None:
+    """Download the page again in a detached process, which this one does not
+    wait for, unless another lookup did so recently."""
+    if not claim_refresh(command, platform, language):
+        return
+    import subprocess
+    if sys.platform == 'win32':
+        options = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        options = {'start_new_session': True}
+    script = (
+        f"import sys; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); "
+        "import tldr; tldr.refresh_page(*sys.argv[1:])"
+    )
+    with trace('refresh', platform=platform, language=language) as span:
+        try:
+            _REFRESH_PROCESSES[:] = [process for process in _REFRESH_PROCESSES if process.poll() is None]
+            _REFRESH_PROCESSES.append(subprocess.Popen(
+                [sys.executable, '-c', script, command, platform, remote or PAGES_SOURCE_LOCATION, language],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                **options
+            ))
+            span.set(outcome='started')
+        except OSError:
+            get_refresh_marker_path(command, platform, language).unlink(missing_ok=True)
+            span.set(outcome='error')
+
+
+def refresh_page(command: str, platform: str, remote: str, language: str) -> None:
+    """Download a page again into the cache, in the process started by refresh_in_background."""
+    try:
+        update_page_for_platform(command, platform, remote, language)
+    except Exception:
+        # The stale page is still shown, and refreshed again after REFRESH_INTERVAL
+        pass
+
+
+async def get_page_for_platform_async(
+    command: str,
+    platform: str,
+    remote: str,
+    language: str,
+    only_use_cache: bool = False,
+    system_cache: bool = False,
+    timeout: float = NETWORK_TIMEOUT
+) -> List[bytes]:
+    """Like get_page_for_platform, without blocking the event loop."""
+    import asyncio
+    from urllib.error import HTTPError
+    try:
+        return await asyncio.to_thread(
+            get_page_for_platform, command, platform, remote, language,
+            only_use_cache=True, system_cache=system_cache
+        )
+    except CacheNotExist:
+        if only_use_cache:
+            raise
+    page_url = get_page_url(command, platform, remote, language)
+    cached_data = None
+    if USE_CACHE:
+        cached_data = await asyncio.to_thread(load_page_from_cache, command, platform, language)
+    request = await asyncio.to_thread(get_request, page_url, cached_data is not None)
+    try:
+        _, headers, data = await open_url_async(request, timeout=timeout)
+    except Exception as err:
+        if not USE_CACHE or cached_data is None:
+            raise
+        if isinstance(err, HTTPError) and err.code == 304:
+            await asyncio.to_thread(touch_page_in_cache, cached_data, command, platform, language)
+        return cached_data.splitlines()
+    if USE_CACHE:
+        await asyncio.to_thread(store_page_to_cache, data, command, platform, language)
+        await asyncio.to_thread(store_validators, page_url, headers)
+    return data.splitlines()
 
 
 def get_platform() -> str:
@@ -258,104 +2305,514 @@ def get_language_list() -> List[str]:
     return languages
 
 
-def get_page_for_every_platform(
-    command: str,
-    remote: Optional[str] = None,
-    platforms: Optional[List[str]] = None,
-    languages: Optional[List[str]] = None
-) -> Union[List[Tuple[str, str]], bool]:
-    """Gives a list of tuples result-platform ordered by priority."""
-    if platforms is None:
-        platforms = get_platform_list()
-    else:
-        # When platform is explicitly specified, ensure 'common' is included as fallback
-        if 'common' not in platforms and len(platforms) > 0:
+class TldrClient:
+    """Looks up pages with a configuration resolved once, for programs using
+    tldr as a library.
+
+    The platforms and languages default to the ones of the environment when
+    the client is created. Pages found are kept in memory, along with their
+    parsed form, up to ``max_pages`` pages and ``max_bytes`` bytes of page
+    contents, evicting the least recently used first. A page in memory is
+    looked up again once it is older than the cache max age. ``hits`` and
+    ``misses`` count the lookups answered from memory or not.
+
+    A client can be shared by threads.
+    """
+
+    def __init__(
+        self,
+        remote: Optional[str] = None,
+        platforms: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None,
+        max_pages: int = 256,
+        max_bytes: int = 4 * 2**20
+    ) -> None:
+        self.remote = remote
+        if platforms is None:
+            platforms = get_platform_list()
+        elif 'common' not in platforms and len(platforms) > 0:
             platforms = platforms + ['common']
-    if languages is None:
-        languages = get_language_list()
-    # only use cache
-    if USE_CACHE:
-        result = list()
+        self.platforms = platforms
+        self.languages = get_language_list() if languages is None else languages
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_platforms(self) -> List[str]:
+        return self.platforms
+
+    def get_languages(self) -> List[str]:
+        return self.languages
+
+    def _lookup(self, key: Tuple) -> Any:
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= MAX_CACHE_AGE * 3600:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                self._evict(key)
+            self.misses += 1
+            return None
+
+    def _store(self, key: Tuple, value: Any, size: int) -> None:
+        if self.max_pages <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._pages:
+                self._evict(key)
+            self._pages[key] = (time.monotonic(), size, value)
+            self._bytes += size
+            while len(self._pages) > self.max_pages or self._bytes > self.max_bytes:
+                self._evict(next(iter(self._pages)))
+
+    def _evict(self, key: Tuple) -> None:
+        """Drop an entry, with the lock held."""
+        self._bytes -= self._pages.pop(key)[1]
+
+    @staticmethod
+    def _key_of(values: Optional[List[str]]) -> Optional[Tuple[str, ...]]:
+        return None if values is None else tuple(values)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pages.clear()
+            self._bytes = 0
+
+    def get_page_for_every_platform(
+        self,
+        command: str,
+        remote: Optional[str] = None,
+        platforms: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None
+    ) -> Union[List[Tuple[str, str]], bool]:
+        """Gives a list of tuples result-platform ordered by priority."""
+        remote = self.remote if remote is None else remote
+        key = ('every', command, remote, self._key_of(platforms), self._key_of(languages))
+        result = self._lookup(key)
+        if result is None:
+            result = self._get_page_for_every_platform(command, remote, platforms, languages)
+            if result:
+                self._store(key, result, sum(len(line) for lines, _ in result for line in lines))
+        return result
+
+    def get_page(
+        self,
+        command: str,
+        remote: Optional[str] = None,
+        platforms: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None
+    ) -> Union[str, bool]:
+        remote = self.remote if remote is None else remote
+        key = ('page', command, remote, self._key_of(platforms), self._key_of(languages))
+        result = self._lookup(key)
+        if result is None:
+            result = self._get_page(command, remote, platforms, languages)
+            if result:
+                self._store(key, result, sum(len(line) for line in result))
+        return result
+
+    async def get_page_for_every_platform_async(
+        self,
+        command: str,
+        remote: Optional[str] = None,
+        platforms: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None
+    ) -> Union[List[Tuple[str, str]], bool]:
+        """Like get_page_for_every_platform, without blocking the event loop."""
+        remote = self.remote if remote is None else remote
+        key = ('every', command, remote, self._key_of(platforms), self._key_of(languages))
+        result = self._lookup(key)
+        if result is None:
+            result = await self._get_page_for_every_platform_async(
+                command, remote, platforms, languages
+            )
+            if result:
+                self._store(key, result, sum(len(line) for lines, _ in result for line in lines))
+        return result
+
+    async def get_page_async(
+        self,
+        command: str,
+        remote: Optional[str] = None,
+        platforms: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None
+    ) -> Union[str, bool]:
+        """Like get_page, without blocking the event loop."""
+        remote = self.remote if remote is None else remote
+        key = ('page', command, remote, self._key_of(platforms), self._key_of(languages))
+        result = self._lookup(key)
+        if result is None:
+            result = await self._get_page_async(command, remote, platforms, languages)
+            if result:
+                self._store(key, result, sum(len(line) for line in result))
+        return result
+
+    def get_parsed_page(self, command: str) -> Optional['Page']:
+        """Return the parsed page of the command for the first platform it
+        exists on, or None if there is no such page."""
+        key = ('parsed', command)
+        page = self._lookup(key)
+        if page is None:
+            results = self.get_page_for_every_platform(command)
+            if not results:
+                return None
+            page = get_parsed_page(results[0][0])
+            self._store(key, page, sum(len(line) for line in results[0][0]))
+        return page
+
+    def _resolve_every_platform(
+        self,
+        platforms: Optional[List[str]],
+        languages: Optional[List[str]]
+    ) -> Tuple[List[str], List[str]]:
+        if platforms is None:
+            platforms = self.get_platforms()
+        else:
+            # When platform is explicitly specified, ensure 'common' is included as fallback
+            if 'common' not in platforms and len(platforms) > 0:
+                platforms = platforms + ['common']
+        if languages is None:
+            languages = self.get_languages()
+        return platforms, languages
+
+    def _get_cached_pages(
+        self,
+        command: str,
+        remote: Optional[str],
+        platforms: List[str],
+        languages: List[str]
+    ) -> List[Tuple[str, str]]:
+        """Look for the pages in the user cache, then in the system cache."""
+        if USE_CACHE:
+            with trace('user cache') as span:
+                result = list(self._iter_cached_pages(command, remote, platforms, languages))
+                span.set(outcome='hit' if result else 'miss')
+            if result:  # Return if smth was found
+                return result
+            # Cache miss, search system cache.
+            with trace('system cache') as span:
+                result = list(self._iter_cached_pages(
+                    command, remote, platforms, languages, system_cache=True
+                ))
+                span.set(outcome='system' if result else 'miss')
+            if result:  # Return if smth was found
+                return result
+        return []
+
+    @staticmethod
+    def _iter_cached_pages(
+        command: str,
+        remote: Optional[str],
+        platforms: List[str],
+        languages: List[str],
+        system_cache: bool = False
+    ) -> Iterator[Tuple[List[bytes], str]]:
+        """Yield the cached page of the command and its platform, for every
+        platform in order of priority.
+
+        The command index tells which platforms and languages have the page
+        in one lookup, so only those are checked and opened.
+        """
+        found = find_cached_pages(command, platforms, languages, system_cache)
         for platform in platforms:
             for language in languages:
-                if platform is None:
+                if platform is None or (found is not None and (platform, language) not in found):
                     continue
                 try:
-                    result.append(
-                        (get_page_for_platform(
-                                command,
-                                platform,
-                                remote,
-                                language,
-                                only_use_cache=True,
-                        ), platform)
-                    )
+                    yield get_page_for_platform(
+                        command,
+                        platform,
+                        remote,
+                        language,
+                        only_use_cache=True,
+                        system_cache=system_cache
+                    ), platform
                     break   # Don't want to look for the same page in other langs
                 except CacheNotExist:
                     continue
+
+    def _get_page_for_every_platform(
+        self,
+        command: str,
+        remote: Optional[str] = None,
+        platforms: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None
+    ) -> Union[List[Tuple[str, str]], bool]:
+        platforms, languages = self._resolve_every_platform(platforms, languages)
+        result = self._get_cached_pages(command, remote, platforms, languages)
         if result:  # Return if smth was found
             return result
-        # Cache miss, search system cache.
-        result = list()
-        for platform in platforms:
+        # Know here that we don't have the info in cache, so probe every platform
+        # at once and collect the answers in order of priority. The languages of
+        # a platform are tried in turn, so that a page found in the preferred
+        # language does not come with downloads of the others.
+        from concurrent.futures import ThreadPoolExecutor
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        from urllib.error import HTTPError, URLError
+        probed = [platform for platform in platforms if platform is not None]
+        deadline = time.monotonic() + NETWORK_TIMEOUT
+        finished = threading.Event()
+
+        def probe(platform: str) -> Tuple[Optional[List[bytes]], Optional[Exception]]:
+            """Return the page of the platform in the first language that has
+            it, or the last error other than a missing page."""
+            TRACER.adopt(span)
+            error = None
             for language in languages:
-                if platform is None:
-                    continue
+                if finished.is_set():
+                    # The answer came too late to be used, so don't cache more
+                    break
                 try:
-                    result.append(
-                        (get_page_for_platform(
-                                command,
-                                platform,
-                                remote,
-                                language,
-                                only_use_cache=True,
-                                system_cache=True
-                        ), platform)
-                    )
-                    break   # Don't want to look for the same page in other langs
-                except CacheNotExist:
-                    continue
+                    return get_page_for_platform(
+                        command,
+                        platform,
+                        remote,
+                        language,
+                        timeout=max(deadline - time.monotonic(), 0.1)
+                    ), error
+                except HTTPError as err:
+                    if err.code != 404:
+                        error = err
+                except URLError as err:
+                    if not PAGES_SOURCE_LOCATION.startswith('file://'):
+                        error = err
+            return None, error
+
+        result = list()
+        error = None
+        executor = ThreadPoolExecutor(max_workers=max(min(NETWORK_JOBS, len(probed)), 1))
+        with trace('network') as span:
+            try:
+                futures = [(platform, executor.submit(probe, platform)) for platform in probed]
+                for platform, future in futures:
+                    try:
+                        page, platform_error = future.result(timeout=max(deadline - time.monotonic(), 0))
+                    except FutureTimeoutError:
+                        page, platform_error = None, URLError(f"timed out after {NETWORK_TIMEOUT}s")
+                    if page is not None:
+                        result.append((page, platform))
+                    elif platform_error is not None:
+                        # Store error for later, only raise if we find no results at all
+                        error = platform_error
+            finally:
+                finished.set()
+                executor.shutdown(wait=False, cancel_futures=True)
+            span.set(outcome='hit' if result else 'miss')
+
         if result:  # Return if smth was found
             return result
-    # Know here that we don't have the info in cache
-    result = list()
-    error = None
-    for platform in platforms:
-        for language in languages:
-            if platform is None:
-                continue
-            try:
-                result.append(
-                    (
-                        get_page_for_platform(
-                            command,
-                            platform,
-                            remote,
-                            language
-                        ),
-                        platform
-                    )
-                )
-                break
-            except HTTPError as err:
-                if err.code != 404:
-                    # Store error for later, only raise if we find no results at all
-                    error = err
-            except URLError as err:
-                if not PAGES_SOURCE_LOCATION.startswith('file://'):
-                    # Store error for later, only raise if we find no results at all
-                    error = err
-
-    if result:  # Return if smth was found
-        return result
 
-    # Reraise the error if we couldn't get the pages for any platform
-    if error is not None:
-        # Note that only the most recent error will be stored and raised
-        raise error
+        # Reraise the error if we couldn't get the pages for any platform
+        if error is not None:
+            # Note that only the most recent error will be stored and raised
+            raise error
 
-    # Otherwise, we got no results nor errors, implies the documentation doesn't exist
-    return False
+        # Otherwise, we got no results nor errors, implies the documentation doesn't exist
+        return False
+
+    def _get_cached_page(
+        self,
+        command: str,
+        remote: Optional[str],
+        platforms: List[str],
+        languages: List[str]
+    ) -> Optional[List[bytes]]:
+        # only use cache
+        if USE_CACHE:
+            with trace('user cache') as span:
+                for page, _ in self._iter_cached_pages(command, remote, platforms, languages):
+                    span.set(outcome='hit')
+                    return page
+                span.set(outcome='miss')
+        return None
+
+    def _get_page(
+        self,
+        command: str,
+        remote: Optional[str] = None,
+        platforms: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None
+    ) -> Union[str, bool]:
+        if platforms is None:
+            platforms = self.get_platforms()
+        if languages is None:
+            languages = self.get_languages()
+        data = self._get_cached_page(command, remote, platforms, languages)
+        if data is not None:
+            return data
+        from urllib.error import HTTPError, URLError
+        with trace('network') as span:
+            for platform in platforms:
+                for language in languages:
+                    if platform is None:
+                        continue
+                    try:
+                        data = get_page_for_platform(command, platform, remote, language)
+                        span.set(outcome='hit')
+                        return data
+                    except HTTPError as err:
+                        if err.code != 404:
+                            raise
+                    except URLError:
+                        if not PAGES_SOURCE_LOCATION.startswith('file://'):
+                            raise
+            span.set(outcome='miss')
+
+        return False
+
+    async def _probe_async(
+        self,
+        command: str,
+        remote: Optional[str],
+        platforms: List[str],
+        languages: List[str]
+    ) -> AsyncIterator[Tuple[str, Union[List[bytes], Exception]]]:
+        """Download the page for every platform at once, and yield each
+        platform with the page or the errors before it, in order of priority.
+
+        As in _get_page_for_every_platform, the languages of a platform are
+        tried in turn, and at most NETWORK_JOBS downloads run at a time.
+        """
+        import asyncio
+        from urllib.error import URLError
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + NETWORK_TIMEOUT
+        semaphore = asyncio.Semaphore(NETWORK_JOBS)
+
+        async def probe(platform: str) -> List[Union[List[bytes], Exception]]:
+            """Return the errors of the languages without the page, followed
+            by the page in the first language that has it."""
+            outcomes = []
+            for language in languages:
+                try:
+                    async with semaphore:
+                        page = await get_page_for_platform_async(
+                            command, platform, remote, language,
+                            timeout=max(deadline - loop.time(), 0.1)
+                        )
+                except Exception as err:
+                    outcomes.append(err)
+                else:
+                    outcomes.append(page)
+                    break
+            return outcomes
+
+        tasks = [
+            (platform, asyncio.ensure_future(probe(platform)))
+            for platform in platforms if platform is not None
+        ]
+        try:
+            for platform, task in tasks:
+                try:
+                    outcomes = await asyncio.wait_for(asyncio.shield(task), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    outcomes = [URLError(f"timed out after {NETWORK_TIMEOUT}s")]
+                for outcome in outcomes:
+                    yield platform, outcome
+        finally:
+            for _, task in tasks:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+
+    @staticmethod
+    def _is_missing_page(err: Exception) -> bool:
+        """Tell whether a download error only means that there is no page."""
+        from urllib.error import HTTPError, URLError
+        if isinstance(err, HTTPError):
+            return err.code == 404
+        return isinstance(err, URLError) and PAGES_SOURCE_LOCATION.startswith('file://')
+
+    async def _get_page_for_every_platform_async(
+        self,
+        command: str,
+        remote: Optional[str] = None,
+        platforms: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None
+    ) -> Union[List[Tuple[str, str]], bool]:
+        import asyncio
+        platforms, languages = self._resolve_every_platform(platforms, languages)
+        result = await asyncio.to_thread(
+            self._get_cached_pages, command, remote, platforms, languages
+        )
+        if result:
+            return result
+        error = None
+        probes = self._probe_async(command, remote, platforms, languages)
+        try:
+            async for platform, page in probes:
+                if not isinstance(page, Exception):
+                    result.append((page, platform))
+                elif not self._is_missing_page(page):
+                    # Only raised if no platform has the page
+                    error = page
+        finally:
+            await probes.aclose()
+        if result:
+            return result
+        if error is not None:
+            raise error
+        return False
+
+    async def _get_page_async(
+        self,
+        command: str,
+        remote: Optional[str] = None,
+        platforms: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None
+    ) -> Union[str, bool]:
+        import asyncio
+        if platforms is None:
+            platforms = self.get_platforms()
+        if languages is None:
+            languages = self.get_languages()
+        data = await asyncio.to_thread(
+            self._get_cached_page, command, remote, platforms, languages
+        )
+        if data is not None:
+            return data
+        probes = self._probe_async(command, remote, platforms, languages)
+        try:
+            async for _, page in probes:
+                if not isinstance(page, Exception):
+                    return page
+                if not self._is_missing_page(page):
+                    raise page
+        finally:
+            await probes.aclose()
+        return False
+
+
+class EnvironmentClient(TldrClient):
+    """The client behind the module level functions, which reads the
+    environment on every lookup and keeps no pages in memory."""
+
+    def __init__(self) -> None:
+        super().__init__(platforms=[], languages=[], max_pages=0)
+
+    def get_platforms(self) -> List[str]:
+        return get_platform_list()
+
+    def get_languages(self) -> List[str]:
+        return get_language_list()
+
+
+DEFAULT_CLIENT = EnvironmentClient()
+
+
+def get_page_for_every_platform(
+    command: str,
+    remote: Optional[str] = None,
+    platforms: Optional[List[str]] = None,
+    languages: Optional[List[str]] = None
+) -> Union[List[Tuple[str, str]], bool]:
+    """Gives a list of tuples result-platform ordered by priority."""
+    return DEFAULT_CLIENT.get_page_for_every_platform(command, remote, platforms, languages)
 
 
 def get_page(
@@ -364,40 +2821,27 @@ def get_page(
     platforms: Optional[List[str]] = None,
     languages: Optional[List[str]] = None
 ) -> Union[str, bool]:
-    if platforms is None:
-        platforms = get_platform_list()
-    if languages is None:
-        languages = get_language_list()
-    # only use cache
-    if USE_CACHE:
-        for platform in platforms:
-            for language in languages:
-                if platform is None:
-                    continue
-                try:
-                    return get_page_for_platform(
-                        command,
-                        platform,
-                        remote,
-                        language,
-                        only_use_cache=True,
-                    )
-                except CacheNotExist:
-                    continue
-    for platform in platforms:
-        for language in languages:
-            if platform is None:
-                continue
-            try:
-                return get_page_for_platform(command, platform, remote, language)
-            except HTTPError as err:
-                if err.code != 404:
-                    raise
-            except URLError:
-                if not PAGES_SOURCE_LOCATION.startswith('file://'):
-                    raise
+    return DEFAULT_CLIENT.get_page(command, remote, platforms, languages)
 
-    return False
+
+async def get_page_for_every_platform_async(
+    command: str,
+    remote: Optional[str] = None,
+    platforms: Optional[List[str]] = None,
+    languages: Optional[List[str]] = None
+) -> Union[List[Tuple[str, str]], bool]:
+    return await DEFAULT_CLIENT.get_page_for_every_platform_async(
+        command, remote, platforms, languages
+    )
+
+
+async def get_page_async(
+    command: str,
+    remote: Optional[str] = None,
+    platforms: Optional[List[str]] = None,
+    languages: Optional[List[str]] = None
+) -> Union[str, bool]:
+    return await DEFAULT_CLIENT.get_page_async(command, remote, platforms, languages)
 
 
 DEFAULT_COLORS = {
@@ -431,28 +2875,91 @@ COMMAND_SPLIT_REGEX = re.compile(r'(?P<param>{{.+?}*}})')
 PARAM_REGEX = re.compile(r'(?:{{)(?P<param>.+?)(?:}})')
 
 
+def get_command_entries(languages: List[str]) -> List[CommandEntry]:
+    """Return the pages of the user cache, then the ones of the system cache."""
+    entries = []
+    if get_cache_dir().exists():
+        # Only walk the cache when the index is missing or out of date
+        index = open_command_index(languages)
+        entries += index.entries() if index is not None else build_command_index()
+    if get_system_cache_dir().is_dir():
+        # The system cache is not ours to write, so walk it instead
+        index = open_command_index(languages, system_cache=True)
+        entries += index.entries() if index is not None else scan_command_entries(system_cache=True)[0]
+    return entries
+
+
 def get_commands(platforms: Optional[List[str]] = None,
                  language: Optional[str] = None) -> List[str]:
     if platforms is None:
         platforms = get_platform_list()
 
-    if language:
-        languages = [get_language_code(language[0])]
-    else:
-        languages = get_language_list()
-
-    commands = []
-    if get_cache_dir().exists():
-        for platform in platforms:
-            for language in languages:
-                pages_dir = f'pages.{language}' if language != 'en' else 'pages'
-                path = get_cache_dir() / pages_dir / platform
-                if not path.exists():
-                    continue
-                commands += [f"{file.stem}"
-                             for file in path.iterdir()
-                             if file.suffix == '.md']
-    return commands
+    if language:
+        languages = [get_language_code(language[0])]
+    else:
+        languages = get_language_list()
+
+    found = {}
+    for command, platform, language, _, _ in get_command_entries(languages):
+        found.setdefault((platform, language), set()).add(command)
+    commands = []
+    for platform in platforms:
+        for language in languages:
+            commands += sorted(found.get((platform, language), ()))
+    return commands
+
+
+def get_search_languages(language: Optional[str] = None) -> List[str]:
+    if language:
+        return [get_language_code(language[0])]
+    return get_language_list()
+
+
+def get_search_indexes(languages: List[str]) -> List[SearchIndex]:
+    """Return the search indexes of the user and system caches, building
+    the one of the user cache if it is missing or out of date."""
+    indexes = []
+    if get_cache_dir().exists():
+        # Only read the pages again when the index is missing, or after an update
+        index = open_search_index(languages)
+        if index is None:
+            build_search_index()
+            index = open_search_index(languages)
+        if index is not None:
+            indexes.append(index)
+    index = open_search_index(languages, system_cache=True)
+    if index is not None:
+        indexes.append(index)
+    return indexes
+
+
+def search_pages(
+    query: str,
+    platforms: Optional[List[str]] = None,
+    language: Optional[str] = None
+) -> List[SearchResult]:
+    """Return every page whose command name contains the query, by name,
+    followed by the other pages matching the words of the query, best first."""
+    if platforms is None:
+        platforms = get_platform_list()
+    languages = get_search_languages(language)
+    indexes = get_search_indexes(languages)
+
+    names = []
+    ranked = []
+    for index in indexes:
+        names += index.name_matches(query, platforms, languages)
+        ranked += index.search(query, platforms, languages, limit=None)
+    # Exact names first, then the system cache merged in with one page per command
+    names.sort(key=lambda result: (result[0].lower() != query.lower(), result[0]))
+    ranked.sort(key=lambda result: -result[4])
+    seen = set()
+    merged = []
+    for result in names + ranked:
+        if result[0] not in seen:
+            seen.add(result[0])
+            merged.append(result)
+    return merged
 
 
 def colors_of(key: str) -> Tuple[str, str, List[str]]:
@@ -471,152 +2978,953 @@ def colors_of(key: str) -> Tuple[str, str, List[str]]:
     return (color, on_color, attrs)
 
 
-def output(page: str, display_option_length: str, plain: bool = False) -> None:
-    def emphasise_example(x: str) -> str:
+STYLE_PLACEHOLDER = '\0'
+_STYLES = {}
+
+
+def get_styles() -> Dict[str, Tuple[str, str]]:
+    """Return the ANSI codes to put before and after the text of every color
+    key, and of code in example descriptions.
+
+    The codes are the ones termcolor puts around a placeholder, so the page
+    comes out as if every piece was colored on its own. They are kept while
+    the color settings do not change.
+    """
+    from termcolor import colored
+    # Also tells whether termcolor colors the output at all
+    colorized = colored(STYLE_PLACEHOLDER, 'red') != STYLE_PLACEHOLDER
+    key = (colorized, tuple(os.environ.get(f"TLDR_COLOR_{name.upper()}") for name in DEFAULT_COLORS))
+    styles = _STYLES.get(key)
+    if styles is None:
+        styles = {
+            name: tuple(colored(STYLE_PLACEHOLDER, *colors_of(name)).split(STYLE_PLACEHOLDER))
+            for name in DEFAULT_COLORS
+        }
         # Use ANSI escapes to enable italics at the start and disable at the end
         # Also use the color yellow to differentiate from the default green
-        return "\x1B[3m" + colored(x.group('example'), 'yellow') + "\x1B[23m"
+        prefix, suffix = colored(STYLE_PLACEHOLDER, 'yellow').split(STYLE_PLACEHOLDER)
+        styles['code'] = ("\x1B[3m" + prefix, suffix + "\x1B[23m")
+        _STYLES[key] = styles
+    return styles
 
-    if not plain:
-        print()
-    for line in page:
-        line = line.rstrip().decode('utf-8')
 
-        if plain:
-            print(line)
-            continue
+OPTION_REGEX = re.compile(r'{{\[(?P<short>[^|]+)\|(?P<long>[^|]+?)\]}}')
+
+
+class Token(NamedTuple):
+    """A piece of an example command.
+
+    ``kind`` is ``command`` for the command itself, ``parameter`` for a
+    placeholder, ``option`` for a placeholder offering the ``short`` and
+    ``long`` form of an option, or ``raw`` for text printed without colors.
+    """
+    kind: str
+    text: str
+    short: str = ''
+    long: str = ''
+
+
+class Example(NamedTuple):
+    # Pieces of the description, and whether each one is code between backticks
+    description: List[Tuple[str, bool]]
+    command: List[Token]
+
+
+class Page(NamedTuple):
+    """A page split into its parts, so it can be rendered without parsing it again.
+
+    ``lines`` holds a ``(kind, value)`` pair per non-empty line, in page
+    order, where kind is ``name``, ``description``, ``example`` (a list of
+    description pieces), ``command`` (a list of tokens) or ``other``.
+    """
+    lines: List[Tuple[str, Any]]
+
+    @property
+    def title(self) -> Optional[str]:
+        return next((value for kind, value in self.lines if kind == 'name'), None)
+
+    @property
+    def description(self) -> List[str]:
+        return [value for kind, value in self.lines if kind == 'description']
+
+    @property
+    def examples(self) -> List[Example]:
+        examples = []
+        for kind, value in self.lines:
+            if kind == 'example':
+                examples.append(Example(value, []))
+            elif kind == 'command' and examples and not examples[-1].command:
+                examples[-1] = examples[-1]._replace(command=value)
+        return examples
+
+    def to_json(self) -> str:
+        import json
+        return json.dumps(self.lines, ensure_ascii=False, separators=(',', ':'))
 
-        elif len(line) == 0:
+    @classmethod
+    def from_json(cls, data: str) -> 'Page':
+        import json
+        lines = []
+        for kind, value in json.loads(data):
+            if kind == 'example':
+                value = [tuple(piece) for piece in value]
+            elif kind == 'command':
+                value = [Token(*token) for token in value]
+            lines.append((kind, value))
+        return cls(lines)
+
+
+def parse_command(line: str) -> List[Token]:
+    # Handle escaped placeholders first
+    line = line.replace(r'\{\{', '__ESCAPED_OPEN__')
+    line = line.replace(r'\}\}', '__ESCAPED_CLOSE__')
+
+    def restore(text: str) -> str:
+        return text.replace('__ESCAPED_OPEN__', '{{').replace('__ESCAPED_CLOSE__', '}}')
+
+    tokens = []
+    for index, item in enumerate(COMMAND_SPLIT_REGEX.split(line)):
+        if index % 2 == 0:
+            tokens.append(Token('command', restore(item)))
             continue
+        option = OPTION_REGEX.fullmatch(item)
+        if option:
+            tokens.append(Token(
+                'option',
+                restore(item[2:-2]),
+                restore(option.group('short')),
+                restore(option.group('long'))
+            ))
+            continue
+        end = 0
+        for param in PARAM_REGEX.finditer(item):
+            if param.start() > end:
+                tokens.append(Token('raw', restore(item[end:param.start()])))
+            tokens.append(Token('parameter', restore(param.group('param'))))
+            end = param.end()
+        if end < len(item):
+            tokens.append(Token('raw', restore(item[end:])))
+    return tokens
 
-        # Handle the command name
-        elif line[0] == '#':
-            line = ' ' * LEADING_SPACES_NUM + \
-                colored(line.replace('# ', ''), *colors_of('name')) + '\n'
-            sys.stdout.buffer.write(line.encode('utf-8'))
 
-        # Handle the command description
+def parse_page(page: Iterable[bytes]) -> Page:
+    lines = []
+    for line in page:
+        line = line.rstrip().decode('utf-8')
+        if len(line) == 0:
+            continue
+        elif line[0] == '#':
+            lines.append(('name', line.replace('# ', '')))
         elif line[0] == '>':
-            line = ' ' * (LEADING_SPACES_NUM - 1) + \
-                colored(
-                    line.replace('>', '').replace('<', ''),
-                    *colors_of('description')
-                )
-            sys.stdout.buffer.write(line.encode('utf-8'))
-
-        # Handle an example description
+            lines.append(('description', line.replace('>', '').replace('<', '')))
         elif line[0] == '-':
-
-            # Stylize text within backticks using yellow italics
             if '`' in line:
-                elements = ['\n', ' ' * LEADING_SPACES_NUM]
-
-                for item in EXAMPLE_SPLIT_REGEX.split(line):
-                    item, replaced = EXAMPLE_REGEX.subn(emphasise_example, item)
-                    if not replaced:
-                        item = colored(item, *colors_of('example'))
-                    elements.append(item)
+                lines.append(('example', [
+                    (item[1:-1], True) if index % 2 else (item, False)
+                    for index, item in enumerate(EXAMPLE_SPLIT_REGEX.split(line))
+                ]))
+            else:
+                lines.append(('example', [(line, False)]))
+        elif line[0] == '`':
+            lines.append(('command', parse_command(line[1:-1])))
+        else:
+            lines.append(('other', None))
+    return Page(lines)
 
-                line = ''.join(elements)
 
-            # Otherwise, use the same colour for the whole line
-            else:
-                line = '\n' + ' ' * LEADING_SPACES_NUM + \
-                    colored(line, *colors_of('example'))
+# Pages parsed in this process, by their contents, up to PARSED_PAGES_SIZE
+# pages. Parsing a page takes about as long as reading a stored parsed form
+# back, so they are not kept on disk.
+_PARSED_PAGES = OrderedDict()
+PARSED_PAGES_SIZE = 64
 
-            sys.stdout.buffer.write(line.encode('utf-8'))
 
-        # Handle an example command
-        elif line[0] == '`':
-            line = line[1:-1]  # Remove backticks for parsing
+def get_parsed_page(page: List[bytes]) -> Page:
+    """Parse a page, reusing the parsed form of a page with the same contents."""
+    key = b'\n'.join(page)
+    parsed = _PARSED_PAGES.get(key)
+    if parsed is not None:
+        _PARSED_PAGES.move_to_end(key)
+        return parsed
+    with trace('parse', bytes=len(key)):
+        parsed = parse_page(page)
+    _PARSED_PAGES[key] = parsed
+    while len(_PARSED_PAGES) > PARSED_PAGES_SIZE:
+        _PARSED_PAGES.popitem(last=False)
+    return parsed
 
-            # Handle escaped placeholders first
-            line = line.replace(r'\{\{', '__ESCAPED_OPEN__')
-            line = line.replace(r'\}\}', '__ESCAPED_CLOSE__')
 
-            # Extract long or short options from placeholders
+def render_command(tokens: List[Token], display_option_length: str) -> List[Tuple[str, str]]:
+    """Resolve the option tokens for the display option length, and return
+    the (color key, text) pieces of the command."""
+    pieces = []
+    for token in tokens:
+        kind, text = token.kind, token.text
+        if kind == 'option':
             if display_option_length == "short":
-                line = re.sub(r'{{\[([^|]+)\|[^|]+?\]}}', r'\1', line)
+                kind, text = 'command', token.short
             elif display_option_length == "long":
-                line = re.sub(r'{{\[[^|]+\|([^|]+?)\]}}', r'\1', line)
+                kind, text = 'command', token.long
+            else:
+                kind = 'parameter'
+        if kind == 'command' and pieces and pieces[-1][0] == 'command':
+            pieces[-1] = ('command', pieces[-1][1] + text)
+        else:
+            pieces.append((kind, text))
+    return pieces
+
 
-            elements = [' ' * 2 * LEADING_SPACES_NUM]
-            for item in COMMAND_SPLIT_REGEX.split(line):
-                item, replaced = PARAM_REGEX.subn(
-                    lambda x: colored(x.group('param'), *colors_of('parameter')),
-                    item)
-                if not replaced:
-                    item = colored(item, *colors_of('command'))
-                elements.append(item)
+def render_page(page: Page, display_option_length: str) -> None:
+    """Render the page into one buffer, written to stdout at once."""
+    with trace('render') as span:
+        styles = get_styles()
+        indent = ' ' * LEADING_SPACES_NUM
+        pieces = ['\n']
+        append = pieces.append
+        for kind, value in page.lines:
+            # Handle the command name
+            if kind == 'name':
+                prefix, suffix = styles['name']
+                append(f"{indent}{prefix}{value}{suffix}\n")
 
-            line = ''.join(elements)
+            # Handle the command description
+            elif kind == 'description':
+                prefix, suffix = styles['description']
+                append(f"{' ' * (LEADING_SPACES_NUM - 1)}{prefix}{value}{suffix}")
 
-            # Restore escaped placeholders
-            line = line.replace('__ESCAPED_OPEN__', '{{')
-            line = line.replace('__ESCAPED_CLOSE__', '}}')
+            # Handle an example description, stylizing text within backticks using yellow italics
+            elif kind == 'example':
+                append('\n' + indent)
+                for text, is_code in value:
+                    prefix, suffix = styles['code' if is_code else 'example']
+                    append(f"{prefix}{text}{suffix}")
 
-            sys.stdout.buffer.write(line.encode('utf-8'))
+            # Handle an example command
+            elif kind == 'command':
+                append(indent * 2)
+                for key, text in render_command(value, display_option_length):
+                    if key == 'raw':
+                        append(text)
+                    else:
+                        prefix, suffix = styles[key]
+                        append(f"{prefix}{text}{suffix}")
+            append('\n')
+        append('\n')
+        data = ''.join(pieces).encode('utf-8')
+        span.set(bytes=len(data))
+        # Anything printed before has to come out first
+        sys.stdout.flush()
+        sys.stdout.buffer.write(data)
+
+
+def output(page: Iterable[bytes], display_option_length: str, plain: bool = False) -> None:
+    if plain:
+        for line in page:
+            print(line.rstrip().decode('utf-8'))
         print()
-    print()
+        return
+    render_page(parse_page(page), display_option_length)
+
+
+def get_peak_memory() -> Optional[int]:
+    """Return the peak resident memory of the process in bytes, if known."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class UpdateStats(NamedTuple):
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+    @property
+    def entries(self) -> int:
+        return self.added + self.changed + self.unchanged
+
+
+def get_manifest_path(language: str) -> Path:
+    return get_cache_dir() / f"{get_pages_dir(language)}.manifest"
 
 
-def update_cache(language: Optional[List[str]] = None) -> None:
+def load_manifest(language: str) -> Dict[str, int]:
+    """Return the CRC32 of every page extracted from the last archive, by
+    ``platform/command`` key."""
+    pages_dir = get_cache_dir() / get_pages_dir(language)
+    if not pages_dir.is_dir():
+        return {}
+    import json
+    try:
+        with get_manifest_path(language).open(encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        pass
+    # No manifest yet, so checksum the pages already in the cache
+    manifest = {}
+    for platform_dir in pages_dir.iterdir():
+        if platform_dir.is_dir():
+            for file in platform_dir.glob('*.md'):
+                manifest[f"{platform_dir.name}/{file.stem}"] = zlib.crc32(file.read_bytes())
+    return manifest
+
+
+def write_manifest(language: str, manifest: Dict[str, int]) -> None:
+    import json
+    with AtomicFile(get_manifest_path(language), 'w', sync=True, encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file)
+
+
+def get_archive_pages(zipfile: 'ZipFile') -> Dict[str, 'ZipInfo']:
+    """Return the entry of every page in the archive, by ``platform/command`` key."""
+    pattern = re.compile(r"(.+)/(.+)\.md")
+    pages = {}
+    for info in zipfile.infolist():
+        match = pattern.match(info.filename)
+        if match:
+            pages[f"{match.group(1)}/{match.group(2)}"] = info
+    return pages
+
+
+def write_page_pack(zipfile: 'ZipFile', pages: Dict[str, 'ZipInfo'], path: Path) -> None:
+    """Write the pages of the archive to a pack, compressed with a dictionary
+    trained on a sample of them if the cache format is ``compressed``."""
+    dictionary = None
+    if CACHE_FORMAT == 'compressed':
+        infos = list(pages.values())
+        step = max(len(infos) // PACK_DICTIONARY_SAMPLE, 1)
+        dictionary = train_dictionary(zipfile.read(info) for info in infos[::step])
+    with PagePackWriter(path, dictionary) as pack:
+        for key, info in pages.items():
+            with zipfile.open(info) as source:
+                pack.add_file(*key.split('/', 1), source)
+
+
+def extract_pages(zipfile: 'ZipFile', language: str) -> UpdateStats:
+    """Bring the cache in line with the archive, one entry at a time.
+
+    The CRC32 in the archive's directory is compared with the one of the
+    cached page, so only added or changed pages are written and pages
+    removed upstream are deleted. A page file that is missing, or whose size
+    differs from the archive's, is written again whatever its CRC32. With
+    the zip format, nothing is written, as the archive itself is kept by
+    extract_archive.
+    """
+    pages = get_archive_pages(zipfile)
+    if CACHE_FORMAT in PACK_FORMATS or CACHE_FORMAT == 'zip':
+        pack = open_page_pack(language) if CACHE_FORMAT in PACK_FORMATS else open_page_archive(language)
+        previous = {} if pack is None else {
+            f"{platform}/{command}": crc for platform, command, _, crc in pack.entries()
+        }
+    else:
+        previous = load_manifest(language)
+
+    def is_cached(key: str, info: 'ZipInfo') -> bool:
+        """Tell whether the page of the entry is in the cache as it is in the archive."""
+        if previous.get(key) != info.CRC:
+            return False
+        if CACHE_FORMAT in PACK_FORMATS or CACHE_FORMAT == 'zip':
+            return True
+        # The manifest only tells what was written, not what is left of it
+        platform, command = key.split('/', 1)
+        try:
+            return get_cache_file_path(command, platform, language).stat().st_size == info.file_size
+        except OSError:
+            return False
+
+    added = changed = unchanged = 0
+    outdated = set()
+    for key, info in pages.items():
+        if key not in previous:
+            added += 1
+        elif not is_cached(key, info):
+            changed += 1
+        else:
+            unchanged += 1
+            continue
+        outdated.add(key)
+    removed = len(previous.keys() - pages.keys())
+
+    if CACHE_FORMAT in PACK_FORMATS:
+        # The pack is a single file, so rewrite it whole, and only when needed
+        compressed = CACHE_FORMAT == 'compressed'
+        if added or changed or removed or (pack is not None and (pack.dictionary is not None) != compressed):
+            write_page_pack(zipfile, pages, get_pack_path(language))
+    elif CACHE_FORMAT != 'zip':
+        for key, info in pages.items():
+            if key not in outdated:
+                continue
+            platform, command = key.split('/', 1)
+            with zipfile.open(info) as source:
+                copy_page_to_cache(source, command, platform, language)
+        for key in previous.keys() - pages.keys():
+            platform, command = key.split('/', 1)
+            get_cache_file_path(command, platform, language).unlink(missing_ok=True)
+        write_manifest(language, {key: info.CRC for key, info in pages.items()})
+    return UpdateStats(added, changed, removed, unchanged)
+
+
+def get_cache_location(language: str) -> str:
+    return f"{DOWNLOAD_CACHE_LOCATION[:-4]}-pages.{language}.zip"
+
+
+def is_language_cached(language: str) -> bool:
+    """Tell whether the cache holds the language in the current cache format,
+    so the archive only needs to be downloaded again if it changed."""
+    if CACHE_FORMAT in PACK_FORMATS:
+        pack = open_page_pack(language)
+        return pack is not None and (pack.dictionary is not None) == (CACHE_FORMAT == 'compressed')
+    if CACHE_FORMAT == 'zip':
+        return get_archive_path(language).is_file()
+    return (get_cache_dir() / get_pages_dir(language)).is_dir()
+
+
+def keep_archive(archive: BinaryIO, path: Path) -> None:
+    """Move a downloaded archive over the one kept in the cache, once it is on disk."""
+    archive.flush()
+    os.fsync(archive.fileno())
+    # An open or mapped file cannot be renamed on Windows
+    archive.close()
+    release_page_store(path)
+    os.replace(archive.name, path)
+
+
+def extract_archive(archive: BinaryIO, language: str, cache_location: str, headers) -> UpdateStats:
+    """Extract a downloaded archive into the cache, or keep it as the cache
+    with the zip format, and remember its validators."""
+    from zipfile import ZipFile
+    with ZipFile(archive) as zipfile:
+        stats = extract_pages(zipfile, language)
+    if CACHE_FORMAT == 'zip':
+        keep_archive(archive, get_archive_path(language))
+    get_update_stamp_path(language).touch()
+    store_validators(cache_location, headers)
+    return stats
+
+
+def update_language_cache(language: str) -> Optional[UpdateStats]:
+    """Download the archive of one language and extract it into the cache.
+
+    Returns what changed in the cache, or None if the archive did not
+    change since the last update.
+    """
+    import shutil
+    from urllib.error import HTTPError
+    cache_dir = get_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cache_location = get_cache_location(language)
+    stamp = get_source_signature(get_update_stamp_path(language))
+    with UpdateLock(language) as lock:
+        if lock.waited and get_source_signature(get_update_stamp_path(language)) != stamp:
+            # Another updater brought the cache up to date while this one waited
+            return None
+        # Spool the archive to disk as it arrives instead of holding it in
+        # memory, next to where the zip format keeps it
+        archive_path = get_temporary_path(get_archive_path(language))
+        try:
+            with archive_path.open('w+b') as archive:
+                try:
+                    with open_url(
+                        get_request(cache_location, conditional=is_language_cached(language))
+                    ) as req:
+                        shutil.copyfileobj(req, archive, DOWNLOAD_CHUNK_SIZE)
+                        headers = req.headers
+                except HTTPError as err:
+                    if err.code != 304:
+                        raise
+                    get_update_stamp_path(language).touch()
+                    return None
+                return extract_archive(archive, language, cache_location, headers)
+        finally:
+            archive_path.unlink(missing_ok=True)
+
+
+async def update_language_cache_async(language: str) -> Optional[UpdateStats]:
+    """Like update_language_cache, without blocking the event loop."""
+    import asyncio
+    from urllib.error import HTTPError
+    cache_dir = get_cache_dir()
+    await asyncio.to_thread(cache_dir.mkdir, parents=True, exist_ok=True)
+    cache_location = get_cache_location(language)
+    stamp_path = get_update_stamp_path(language)
+    stamp = await asyncio.to_thread(get_source_signature, stamp_path)
+    lock = UpdateLock(language)
+    await asyncio.to_thread(lock.acquire)
+    try:
+        if lock.waited and await asyncio.to_thread(get_source_signature, stamp_path) != stamp:
+            # Another updater brought the cache up to date while this one waited
+            return None
+        conditional = await asyncio.to_thread(is_language_cached, language)
+        request = await asyncio.to_thread(get_request, cache_location, conditional)
+        archive_path = get_temporary_path(get_archive_path(language))
+        archive = await asyncio.to_thread(archive_path.open, 'w+b')
+        try:
+            try:
+                _, headers, _ = await open_url_async(request, sink=archive)
+            except HTTPError as err:
+                if err.code != 304:
+                    raise
+                await asyncio.to_thread(stamp_path.touch)
+                return None
+            return await asyncio.to_thread(extract_archive, archive, language, cache_location, headers)
+        finally:
+            await asyncio.to_thread(archive.close)
+            await asyncio.to_thread(archive_path.unlink, missing_ok=True)
+    finally:
+        lock.release()
+
+
+def describe_update(language: str, stats: Optional[UpdateStats]) -> str:
+    if stats is None:
+        return f"Cache for language {language} is already up to date"
+    return (
+        "Updated cache for language "
+        f"{language}: {stats.entries} entries ({stats.added} added, "
+        f"{stats.changed} changed, {stats.removed} removed, {stats.unchanged} unchanged)"
+    )
+
+
+def describe_update_error(language: str) -> str:
+    return (
+        "Error: Unable to update cache for language "
+        f"{language} from {get_cache_location(language)}"
+    )
+
+
+def get_update_languages(language: Optional[List[str]] = None) -> List[str]:
     languages = get_language_list()
     if language and language[0] not in languages:
         languages.append(language[0])
-    for language in languages:
+    return languages
+
+
+def build_indexes(system_cache: bool = False) -> None:
+    """Rebuild the command, suggestion and search indexes after an update."""
+    build_suggestion_index(build_command_index(system_cache), system_cache)
+    build_search_index(system_cache)
+
+
+def print_update_time(start: float) -> None:
+    elapsed = time.perf_counter() - start
+    peak_memory = get_peak_memory()
+    if peak_memory is None:
+        print(f"Cache update took {elapsed:.2f}s")
+    else:
+        print(f"Cache update took {elapsed:.2f}s, peak memory {peak_memory / 2**20:.1f} MiB")
+
+
+def update_cache(language: Optional[List[str]] = None, jobs: int = 1) -> None:
+    languages = get_update_languages(language)
+    start = time.perf_counter()
+
+    def update(language: str) -> str:
         try:
-            cache_location = f"{DOWNLOAD_CACHE_LOCATION[:-4]}-pages.{language}.zip"
-            req = urlopen(Request(
-                cache_location,
-                headers=REQUEST_HEADERS
-            ), context=URLOPEN_CONTEXT)
-            zipfile = ZipFile(BytesIO(req.read()))
-            pattern = re.compile(r"(.+)/(.+)\.md")
-            cached = 0
-            for entry in zipfile.namelist():
-                match = pattern.match(entry)
-                if match:
-                    store_page_to_cache(
-                        zipfile.read(entry),
-                        match.group(2),
-                        match.group(1),
-                        language
-                    )
-                    cached += 1
-            print(
-                "Updated cache for language "
-                f"{language}: {cached} entries"
-            )
+            return describe_update(language, update_language_cache(language))
         except Exception:
-            print(
-                "Error: Unable to update cache for language "
-                f"{language} from {cache_location}"
-            )
+            return describe_update_error(language)
+
+    if jobs > 1 and len(languages) > 1:
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        with ThreadPoolExecutor(max_workers=min(jobs, len(languages))) as executor:
+            for future in as_completed([executor.submit(update, language) for language in languages]):
+                print(future.result())
+    else:
+        for language in languages:
+            print(update(language))
+    build_indexes()
+    print_update_time(start)
+
+
+async def update_cache_async(language: Optional[List[str]] = None) -> None:
+    """Like update_cache, downloading every language at once."""
+    import asyncio
+    languages = get_update_languages(language)
+    start = time.perf_counter()
+
+    async def update(language: str) -> str:
+        try:
+            return describe_update(language, await update_language_cache_async(language))
+        except Exception:
+            return describe_update_error(language)
+
+    for update_done in asyncio.as_completed([update(language) for language in languages]):
+        print(await update_done)
+    await asyncio.to_thread(build_indexes)
+    print_update_time(start)
+
+
+def build_system_language_cache(language: str) -> int:
+    """Download the archive of one language and pack every page of it into
+    the system cache, or keep the archive with the zip format. Returns the
+    number of pages."""
+    import shutil
+    from zipfile import ZipFile
+    archive_path = get_archive_path(language, system_cache=True)
+    with UpdateLock(language, system_cache=True):
+        try:
+            with get_temporary_path(archive_path).open('w+b') as archive:
+                with open_url(get_request(get_cache_location(language))) as req:
+                    shutil.copyfileobj(req, archive, DOWNLOAD_CHUNK_SIZE)
+                with ZipFile(archive) as zipfile:
+                    pages = get_archive_pages(zipfile)
+                    if CACHE_FORMAT != 'zip':
+                        write_page_pack(zipfile, pages, get_pack_path(language, system_cache=True))
+                if CACHE_FORMAT == 'zip':
+                    keep_archive(archive, archive_path)
+        finally:
+            get_temporary_path(archive_path).unlink(missing_ok=True)
+    return len(pages)
+
+
+def build_system_cache(language: Optional[List[str]] = None) -> None:
+    """Build the cache shared by every user of the machine in the system cache
+    directory: a pack of the pages of each language, with their command,
+    suggestion and search indexes.
+
+    Lookups read it after the user cache, so users only need a cache of
+    their own for the pages they download themselves.
+    """
+    cache_dir = get_system_cache_dir()
+    start = time.perf_counter()
+    built = False
+    # Every user must be able to read the cache, whatever the umask of the admin
+    umask = os.umask(0o022)
+    try:
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            sys.exit(f"Error: Unable to create system cache directory {cache_dir}: {e.strerror or e}")
+        for language in get_update_languages(language):
+            try:
+                count = build_system_language_cache(language)
+                print(f"Built system cache for language {language}: {count} entries")
+                built = True
+            except url_error():
+                print(describe_update_error(language))
+            except OSError as e:
+                # Most likely a system cache directory the user cannot write to
+                print(f"Error: Unable to write system cache for language {language}: {e}")
+            except Exception:
+                print(describe_update_error(language))
+        if built:
+            build_indexes(system_cache=True)
+    finally:
+        os.umask(umask)
+    if not built:
+        sys.exit(f"Error: No language was written to the system cache in {cache_dir}")
+    print(f"System cache written to {cache_dir}")
+    print_update_time(start)
 
 
 def clear_cache(language: Optional[List[str]] = None) -> None:
+    import shutil
     languages = get_language_list()
     if language and language[0] not in languages:
         languages.append(language[0])
     for language in languages:
-        pages_dir = f'pages.{language}' if language != 'en' else 'pages'
-        cache_dir = get_cache_dir() / pages_dir
-        if cache_dir.exists() and cache_dir.is_dir():
+        cache_dir = get_cache_dir() / get_pages_dir(language)
+        store_paths = [path for path in (get_pack_path(language), get_archive_path(language)) if path.is_file()]
+        if not cache_dir.is_dir() and not store_paths:
+            print(f"No cache directory found for language {language}")
+            continue
+        with UpdateLock(language):
+            get_manifest_path(language).unlink(missing_ok=True)
+            get_update_stamp_path(language).unlink(missing_ok=True)
+            # The pages refreshed in the background go with the pages
+            shutil.rmtree(get_refresh_dir(language), ignore_errors=True)
             try:
-                shutil.rmtree(cache_dir)
+                get_refresh_dir(language).parent.rmdir()
+            except OSError:
+                # Another language still has pages being refreshed
+                pass
+            cleared = False
+            for store_path in store_paths:
+                try:
+                    release_page_store(store_path)
+                    store_path.unlink()
+                    cleared = True
+                except Exception as e:
+                    print(f"Error: Unable to delete cache file {store_path}: {e}")
+            if cleared and not cache_dir.is_dir():
                 print(f"Cleared cache for language {language}")
-            except Exception as e:
-                print(f"Error: Unable to delete cache directory {cache_dir}: {e}")
-        else:
-            print(f"No cache directory found for language {language}")
+            if cache_dir.is_dir():
+                try:
+                    # Move the pages out of the way at once, so lookups find
+                    # either all or none of them while they are deleted
+                    trash_dir = get_temporary_path(cache_dir)
+                    os.rename(cache_dir, trash_dir)
+                    shutil.rmtree(trash_dir)
+                    print(f"Cleared cache for language {language}")
+                except Exception as e:
+                    print(f"Error: Unable to delete cache directory {cache_dir}: {e}")
+    # The indexes are built from the pages, and go with them
+    for path, indexes in (
+        (get_command_index_path(), _COMMAND_INDEXES),
+        (get_search_index_path(), _SEARCH_INDEXES),
+        (get_suggestion_index_path(), _SUGGESTION_INDEXES),
+    ):
+        cached = indexes.pop(path, None)
+        if cached is not None:
+            cached[1].close()
+        path.unlink(missing_ok=True)
+    # As are the validators of the pages and archives downloaded
+    with VALIDATORS_LOCK:
+        get_validators_path().unlink(missing_ok=True)
+
+
+# Variables of the client applied to each request answered by the server,
+# besides the TLDR_ ones
+SERVER_ENVIRONMENT = ('LANG', 'LANGUAGE', 'NO_COLOR', 'FORCE_COLOR', 'ANSI_COLORS_DISABLED')
+# Set while answering a request, so main does not send it to the server again
+SERVING = False
+# Seconds the server waits for a client to send its request and read the answer
+SERVER_TIMEOUT = 2.0
+
+
+def get_server_socket_path() -> Path:
+    if os.environ.get('XDG_RUNTIME_DIR', False):
+        return Path(os.environ.get('XDG_RUNTIME_DIR')) / 'tldr.sock'
+    return get_cache_dir() / 'tldr.sock'
+
+
+def is_server_variable(name: str) -> bool:
+    return name.startswith('TLDR_') or name in SERVER_ENVIRONMENT
+
+
+def reset_colors() -> None:
+    """Forget whether termcolor found colors to be supported, which newer
+    versions only check once per process, as it changes with each request."""
+    import termcolor.termcolor
+    can_colorize = getattr(termcolor.termcolor, 'can_colorize', None)
+    if hasattr(can_colorize, 'cache_clear'):
+        can_colorize.cache_clear()
+
+
+def is_forwarded(options: Namespace) -> bool:
+    """Tell whether the options only ask for a lookup, a listing or a
+    search, the requests a server answers."""
+    forwarded = options.command or options.list or options.search
+    local = options.update or options.build_system_cache or options.clear_cache or \
+        options.render or options.batch or options.serve
+    return bool(forwarded) and not local
+
+
+def is_request_allowed(args: List[str]) -> bool:
+    """Tell whether a client sent the arguments of a request a server answers."""
+    import contextlib
+    if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+        return False
+    try:
+        # Keep the usage of invalid arguments out of the output of the server
+        with contextlib.redirect_stdout(StringIO()), contextlib.redirect_stderr(StringIO()):
+            options = create_parser(completion=False).parse_args(args)
+    except SystemExit:
+        return False
+    return is_forwarded(options)
+
+
+def answer_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Run main for the arguments and environment of a client, and return
+    its exit status and output.
+
+    A client whose settings read at startup differ from the ones of the
+    server is declined, so that it looks the page up itself, and so is any
+    request other than a lookup, ``--list`` or ``--search``.
+    """
+    global SERVING
+    if any(request['env'].get(name) != value for name, value in STARTUP_ENVIRONMENT.items()):
+        return {'declined': True}
+    if not is_request_allowed(request.get('args')):
+        return {'declined': True}
+    stdout = BytesIO()
+    stderr = BytesIO()
+    saved = (sys.argv, sys.stdout, sys.stderr, dict(os.environ))
+    status = 0
+    sys.stdout = TextIOWrapper(stdout, encoding='utf-8', write_through=True)
+    sys.stderr = TextIOWrapper(stderr, encoding='utf-8', write_through=True)
+    try:
+        SERVING = True
+        sys.argv = ['tldr'] + request['args']
+        for name in [name for name in os.environ if is_server_variable(name)]:
+            del os.environ[name]
+        os.environ.update({
+            name: value for name, value in request['env'].items() if is_server_variable(name)
+        })
+        # The output is captured, so keep the colors the client's terminal would get
+        if request.get('tty') and 'NO_COLOR' not in os.environ:
+            os.environ.setdefault('FORCE_COLOR', '1')
+        reset_colors()
+        try:
+            main()
+        except SystemExit as err:
+            if isinstance(err.code, int):
+                status = err.code
+            elif err.code is not None:
+                print(err.code, file=sys.stderr)
+                status = 1
+        except Exception as err:
+            print(f"Error: {err}", file=sys.stderr)
+            status = 1
+    finally:
+        sys.stdout.detach()
+        sys.stderr.detach()
+        sys.argv, sys.stdout, sys.stderr, environ = saved
+        os.environ.clear()
+        os.environ.update(environ)
+        reset_colors()
+        SERVING = False
+    return {
+        'status': status,
+        'stdout': stdout.getvalue().decode('utf-8'),
+        'stderr': stderr.getvalue().decode('utf-8')
+    }
+
+
+def serve(path: Optional[Path] = None) -> None:
+    """Answer the requests of other tldr processes over a Unix socket, one at
+    a time, until interrupted.
+
+    The page packs, indexes and parsed pages loaded for a request stay in
+    memory for the next ones. They are checked against the cache on every
+    use, so an update of the cache is picked up by the next request.
+    """
+    import json
+    import signal
+    import socket
+    if not hasattr(socket, 'AF_UNIX'):
+        sys.exit("Error: --serve needs Unix domain sockets, which this system does not support")
+    if path is None:
+        path = get_server_socket_path()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.connect(str(path))
+    except OSError:
+        pass
+    else:
+        server.close()
+        sys.exit(f"Error: a tldr server is already listening on {path}")
+    server.close()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Remove the socket of a server that did not exit cleanly
+    path.unlink(missing_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    if threading.current_thread() is threading.main_thread():
+        # Exit through the finally clause below, which removes the socket
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.bind(str(path))
+        os.chmod(path, 0o600)
+        server.listen()
+        print(f"Serving tldr pages on {path}", flush=True)
+        while True:
+            connection, _ = server.accept()
+            # A client that sends nothing must not hold up the next ones
+            connection.settimeout(SERVER_TIMEOUT)
+            try:
+                with connection, connection.makefile('rwb') as stream:
+                    request = json.loads(stream.readline())
+                    if isinstance(request, dict) and isinstance(request.get('env'), dict):
+                        stream.write(json.dumps(answer_request(request)).encode('utf-8') + b'\n')
+            except (OSError, ValueError):
+                # The client sent no request in time, or went away
+                continue
+    finally:
+        server.close()
+        path.unlink(missing_ok=True)
+
+
+def request_server(args: List[str], path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """Send the arguments to a running server, and return its answer, or
+    None when no server is listening or it declined the request."""
+    if path is None:
+        path = get_server_socket_path()
+    if not path.exists():
+        return None
+    import json
+    import socket
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            # A page missing from the cache may take the network timeout to fetch
+            connection.settimeout(NETWORK_TIMEOUT * 2)
+            connection.connect(str(path))
+            with connection.makefile('rwb') as stream:
+                stream.write(json.dumps({
+                    'args': args,
+                    'env': {name: value for name, value in os.environ.items() if is_server_variable(name)},
+                    'tty': sys.stdout.isatty()
+                }).encode('utf-8') + b'\n')
+                stream.flush()
+                response = json.loads(stream.readline())
+    except (OSError, ValueError):
+        return None
+    return None if response.get('declined') else response
+
+
+def get_completion_preamble() -> Dict[str, str]:
+    return {
+        'bash': r'''shtab_tldr_cmd_list(){{
+          compgen -W "$("{py}" -m tldr --list)" -- "$1"
+        }}'''.format(py=sys.executable),
+        'zsh': r'''shtab_tldr_cmd_list(){{
+          _describe 'command' "($("{py}" -m tldr --list))"
+        }}'''.format(py=sys.executable)
+    }
+
+
+def is_completion_needed(args: List[str]) -> bool:
+    """Tell whether the arguments may ask for the help or for a completion
+    script, the only uses of the option added by shtab."""
+    if not args:
+        return True
+    for arg in args:
+        if arg == '--':
+            break
+        option = arg.split('=', 1)[0]
+        if option.startswith('--'):
+            if len(option) > 2 and ('--print-completion'.startswith(option) or '--help'.startswith(option)):
+                return True
+        elif option.startswith('-') and 'h' in option:
+            return True
+    return False
+
+
+class TerminalHelpFormatter(HelpFormatter):
+    """The help formatter of argparse, sized to the terminal the same way,
+    but without the import of shutil it makes for every argument added to
+    the parser, which a lookup would pay for and never use."""
+
+    def __init__(self, prog: str, **kwargs: Any) -> None:
+        if kwargs.get('width') is None:
+            kwargs['width'] = get_terminal_columns() - 2
+        super().__init__(prog, **kwargs)
+
+
+def get_terminal_columns() -> int:
+    """Return the width of the terminal as shutil.get_terminal_size does."""
+    try:
+        columns = int(os.environ['COLUMNS'])
+    except (KeyError, ValueError):
+        columns = 0
+    if columns <= 0:
+        try:
+            columns = os.get_terminal_size(sys.__stdout__.fileno()).columns
+        except (AttributeError, ValueError, OSError):
+            columns = 0
+    return columns or 80
 
 
-def create_parser() -> ArgumentParser:
+def create_parser(completion: bool = True) -> ArgumentParser:
+    """Build the argument parser, with the ``--print-completion`` option of
+    shtab unless ``completion`` is false, which saves importing shtab."""
     parser = ArgumentParser(
         prog="tldr",
         usage="tldr command [options]",
-        description="Python command line client for tldr"
+        description="Python command line client for tldr",
+        formatter_class=TerminalHelpFormatter
     )
     parser.add_argument(
         '-v', '--version',
@@ -636,6 +3944,15 @@ def create_parser() -> ArgumentParser:
                         action='store_true',
                         help="Update the local cache of pages and exit")
 
+    parser.add_argument('--build-system-cache',
+                        action='store_true',
+                        help="Build the cache shared by all users in the system cache directory and exit")
+
+    parser.add_argument('-j', '--jobs',
+                        default=1,
+                        type=int,
+                        help="Number of languages to update at the same time with --update")
+
     parser.add_argument('-k', '--clear-cache',
                         action='store_true',
                         help="Delete the local cache of pages and exit")
@@ -681,6 +3998,11 @@ def create_parser() -> ArgumentParser:
                         type=str,
                         help='Override the default language')
 
+    parser.add_argument('-b', '--batch',
+                        metavar='FILE',
+                        type=str,
+                        help='Print the pages of the commands listed in FILE, one per line ("-" for stdin)')
+
     parser.add_argument('-m', '--markdown',
                         default=False,
                         action='store_true',
@@ -696,27 +4018,103 @@ def create_parser() -> ArgumentParser:
                         action="store_true",
                         help='Display longform options over shortform')
 
+    parser.add_argument('--serve',
+                        default=False,
+                        action='store_true',
+                        help='Answer the lookups of other tldr commands from memory, over a local socket')
+
+    parser.add_argument('--profile',
+                        default=False,
+                        action='store_true',
+                        help='Print the time spent in each phase of the lookup to stderr, '
+                             'as JSON lines if TLDR_TRACE is json')
+
     parser.add_argument(
         'command', type=str, nargs='*', help="command to lookup", metavar='command'
     ).complete = {"bash": "shtab_tldr_cmd_list", "zsh": "shtab_tldr_cmd_list"}
 
-    shtab.add_argument_to(parser, preamble={
-        'bash': r'''shtab_tldr_cmd_list(){{
-          compgen -W "$("{py}" -m tldr --list)" -- "$1"
-        }}'''.format(py=sys.executable),
-        'zsh': r'''shtab_tldr_cmd_list(){{
-          _describe 'command' "($("{py}" -m tldr --list))"
-        }}'''.format(py=sys.executable)
-    })
+    if completion:
+        import shtab
+        shtab.add_argument_to(parser, preamble=get_completion_preamble())
 
     return parser
 
 
+def print_page(
+    command: str,
+    results: List[Tuple[str, str]],
+    display_option_length: str,
+    options: Namespace
+) -> None:
+    """Print the first page found, with notes about the pages for other platforms."""
+    if options.markdown:
+        output(results[0][0], display_option_length, plain=True)
+    else:
+        render_page(get_parsed_page(results[0][0]), display_option_length)
+
+    if results[0][1] not in (get_platform(), "common") and not options.platform:
+        warning_suffix = (
+            f": showing page from platform '{results[0][1]}', "
+            f"because '{command}' does not exist in '{get_platform()}' and 'common'."
+        )
+        if options.markdown:
+            print(f"warning{warning_suffix}")
+        else:
+            from termcolor import colored
+            print(f"{colored('warning', 'yellow')}{warning_suffix}")
+
+    if results[1:]:
+        platforms_str = [result[1] for result in results[1:]]
+        are_multiple_platforms = len(platforms_str) > 1
+        if are_multiple_platforms:
+            print(
+                f"Found {len(platforms_str)} pages with the same name"
+                f" under the platforms: {', '.join(platforms_str)}."
+            )
+        else:
+            print(
+                f"Found 1 page with the same name"
+                f" under the platform: {platforms_str[0]}."
+            )
+
+
 def main() -> None:
-    parser = create_parser()
+    parser = create_parser(completion=is_completion_needed(sys.argv[1:]))
 
     options = parser.parse_args()
 
+    if options.serve:
+        serve()
+        return
+    trace_format = get_trace_format(os.environ.get('TLDR_TRACE'))
+    if options.profile and trace_format is None:
+        trace_format = 'summary'
+    if trace_format is None:
+        run(parser, options)
+        return
+    TRACER.enable(trace_format)
+    if not SERVING:
+        # The CPU time of the interpreter startup and of the imports
+        TRACER.add('startup', time.process_time())
+    try:
+        run(parser, options)
+    finally:
+        TRACER.report()
+        TRACER.disable()
+
+
+def run(parser: ArgumentParser, options: Namespace) -> None:
+    # Let a running server answer lookups, listings and searches
+    if is_forwarded(options) and not SERVING:
+        with trace('server') as span:
+            response = request_server(sys.argv[1:])
+            span.set(outcome='miss' if response is None else 'hit')
+        if response is not None:
+            sys.stdout.buffer.write(response['stdout'].encode('utf-8'))
+            sys.stdout.flush()
+            sys.stderr.write(response['stderr'])
+            sys.exit(response['status'])
+
     if sys.platform == "win32":
         import colorama
         colorama.init(strip=options.color)
@@ -730,6 +4128,7 @@ def main() -> None:
                 f"Warning: '{platform_env}' is not a supported TLDR_PLATFORM environment value."
                 "\nFalling back to auto-detection."
             )
+            from termcolor import colored
             print(colored(warning_msg, 'yellow'))
 
     display_option_length = "long"
@@ -750,7 +4149,10 @@ def main() -> None:
         os.environ["FORCE_COLOR"] = "true"
 
     if options.update:
-        update_cache(language=options.language)
+        update_cache(language=options.language, jobs=options.jobs)
+    elif options.build_system_cache:
+        build_system_cache(language=options.language)
+        return
     elif len(sys.argv) == 1:
         parser.print_help(sys.stderr)
         sys.exit(1)
@@ -771,22 +4173,63 @@ def main() -> None:
                            display_option_length,
                            plain=options.markdown)
     elif options.search:
-        search_term = options.search.lower()
-        commands = get_commands(options.platform, options.language)
-        if not commands:
-            print("Update cache, no commands to check from.")
-            return
-        similar_commands = []
-        for command in commands:
-            if search_term in command.lower():
-                similar_commands.append(command)
-        if similar_commands:
+        results = search_pages(options.search, options.platform, options.language)
+        if results:
+            # Every command whose name matches is shown, and the best pages
+            # matching the words of the search term after them
+            names = sum(options.search.lower() in result[0].lower() for result in results)
+            shown = results[:max(names, SEARCH_RESULTS)]
+            width = max(len(result[0]) for result in shown)
             print("Similar commands found:")
-            print('\n'.join(similar_commands))
+            for command, _, _, description, _ in shown:
+                print(f"{command:<{width}}  {description}".rstrip())
+            if len(results) > len(shown):
+                print(f"{len(results) - len(shown)} more pages match, refine the search term to see them.")
+            return
+        elif not any(len(index) for index in get_search_indexes(get_search_languages(options.language))):
+            print("Update cache, no commands to check from.")
             return
         else:
             print("No commands matched your search term.")
             sys.exit(1)
+    elif options.batch:
+        # Resolve the platforms and languages once for every page of the batch
+        platforms = options.platform or get_platform_list()
+        languages = options.language or get_language_list()
+        try:
+            batch_file = sys.stdin if options.batch == '-' else \
+                open(options.batch, encoding='utf-8')
+        except OSError as e:
+            sys.exit(f"Error: Unable to read {options.batch}: {e.strerror or e}")
+        missing = False
+        with batch_file:
+            for line in batch_file:
+                command = '-'.join(line.split()).lower()
+                if not command:
+                    continue
+                print(f"==> {command} <==")
+                try:
+                    results = get_page_for_every_platform(
+                        command,
+                        options.source,
+                        platforms,
+                        languages
+                    )
+                except url_error() as e:
+                    print(f"Error fetching {command} from tldr: {e}", file=sys.stderr)
+                    missing = True
+                    continue
+                if not results:
+                    print(f"`{command}` documentation is not available.", file=sys.stderr)
+                    suggestions = get_suggestions(command)
+                    if suggestions:
+                        print(f"Did you mean: {', '.join(suggestions)}?", file=sys.stderr)
+                    missing = True
+                    continue
+                print_page(command, results, display_option_length, options)
+                sys.stdout.flush()
+        if missing:
+            sys.exit(1)
     elif not options.command == []:
         try:
             command = '-'.join(options.command).lower()
@@ -797,38 +4240,18 @@ def main() -> None:
                 options.language
             )
             if not results:
+                suggestions = get_suggestions(command)
                 sys.exit((
-                    "`{cmd}` documentation is not available.\n"
+                    "`{cmd}` documentation is not available.\n{suggestions}"
                     "If you want to contribute it, feel free to"
                     " send a pull request to: https://github.com/tldr-pages/tldr"
-                ).format(cmd=command))
+                ).format(
+                    cmd=command,
+                    suggestions=f"Did you mean: {', '.join(suggestions)}?\n" if suggestions else ''
+                ))
             else:
-                output(results[0][0], display_option_length, plain=options.markdown)
-
-                if results[0][1] not in (get_platform(), "common") and not options.platform:
-                    warning_suffix = (
-                        f": showing page from platform '{results[0][1]}', "
-                        f"because '{command}' does not exist in '{get_platform()}' and 'common'."
-                    )
-                    if options.markdown:
-                        print(f"warning{warning_suffix}")
-                    else:
-                        print(f"{colored('warning', 'yellow')}{warning_suffix}")
-
-                if results[1:]:
-                    platforms_str = [result[1] for result in results[1:]]
-                    are_multiple_platforms = len(platforms_str) > 1
-                    if are_multiple_platforms:
-                        print(
-                            f"Found {len(platforms_str)} pages with the same name"
-                            f" under the platforms: {', '.join(platforms_str)}."
-                        )
-                    else:
-                        print(
-                            f"Found 1 page with the same name"
-                            f" under the platform: {platforms_str[0]}."
-                        )
-        except URLError as e:
+                print_page(command, results, display_option_length, options)
+        except url_error() as e:
             sys.exit("Error fetching from tldr: {}".format(e))
 
 